@@ -1,84 +1,185 @@
 import azure.functions as func
+import asyncio
 import logging
+import uuid
+from dataclasses import asdict
 from datetime import datetime, date
-import json
+import orjson
 
-# Reduce Azure SDK logging verbosity
+# Reduce SDK logging verbosity
 logging.getLogger('azure').setLevel(logging.WARNING)
 logging.getLogger('azure.core.pipeline.policies.http_logging_policy').setLevel(logging.WARNING)
+logging.getLogger('urllib3').setLevel(logging.WARNING)
+logging.getLogger('aiohttp.access').setLevel(logging.WARNING)
 
-# Import Table Storage Manager instead of SQLite
+# Import Table Storage Manager instead of SQLite. The Excel reader
+# (pandas/openpyxl), UPS tracker (requests/aiohttp), and data processor are
+# imported lazily in their getters so /health cold starts don't pay for them
 from modules.table_storage_manager import TableStorageManager
-from modules.excel_reader import ExcelReader
-from modules.ups_tracker import UPSTracker
-from modules.data_processor import DataProcessor
+from modules.agent_query_processor import AgentQuery, AgentQueryProcessor
 
 app = func.FunctionApp()
 
+# Shared fallback for Excel lookups - avoids allocating a new empty dict
+# per iteration in the per-shipment loop
+_EMPTY: dict = {}
+
+
+def _dump(obj) -> bytes:
+    """Serialize a response body with orjson (C-level, datetime-aware, bytes out)"""
+    return orjson.dumps(obj, option=orjson.OPT_INDENT_2, default=str)
+
+# Component singletons - Azure Functions reuses the worker process between
+# invocations, so constructing these once per worker avoids repeating the
+# Table Storage client setup (TCP+TLS handshake) on every call
+_db = None
+_excel_reader = None
+_ups_tracker = None
+_data_processor = None
+
+
+def get_db() -> TableStorageManager:
+    global _db
+    if _db is None:
+        _db = TableStorageManager()
+    return _db
+
+
+def get_excel_reader():
+    global _excel_reader
+    if _excel_reader is None:
+        from modules.excel_reader import ExcelReader
+        _excel_reader = ExcelReader()
+    return _excel_reader
+
+
+def get_ups_tracker():
+    global _ups_tracker
+    if _ups_tracker is None:
+        from modules.ups_tracker import UPSTracker
+        # Share the OAuth token across workers/instances via Table Storage
+        _ups_tracker = UPSTracker(token_store=get_db())
+    return _ups_tracker
+
+
+def get_data_processor():
+    global _data_processor
+    if _data_processor is None:
+        from modules.data_processor import DataProcessor
+        _data_processor = DataProcessor()
+    return _data_processor
+
 @app.function_name(name="hourly_tracking_update")
 @app.timer_trigger(schedule="0 0 * * * *", arg_name="myTimer", run_on_startup=False, use_monitor=False) 
-def hourly_tracking_update(myTimer: func.TimerRequest) -> None:
+async def hourly_tracking_update(myTimer: func.TimerRequest) -> None:
     """Main hourly tracking update function - runs every hour"""
     
     timestamp = datetime.now().isoformat()
     logging.info(f"🚀 Tracking update started at {timestamp}")
     
     try:
-        # Initialize components with Table Storage
-        db = TableStorageManager()
-        excel_reader = ExcelReader()
-        ups_tracker = UPSTracker()
-        data_processor = DataProcessor()
+        # Initialize components with Table Storage (cached per worker)
+        db = get_db()
+        excel_reader = get_excel_reader()
+        ups_tracker = get_ups_tracker()
+        data_processor = get_data_processor()
         
-        # Step 1: Load tracking numbers from Excel
+        # Step 1: Load tracking numbers from Excel (columnar frame keyed by
+        # tracking number - one set of arrays instead of a dict per row)
         logging.info("📊 Loading tracking numbers from Excel...")
-        excel_data = excel_reader.load_tracking_numbers()
-        logging.info(f"✓ Found {len(excel_data)} tracking numbers in Excel")
-        
-        # Step 2: Add new tracking numbers to database
+        excel_frame = excel_reader.load_tracking_frame()
+        logging.info(f"✓ Found {len(excel_frame)} tracking numbers in Excel")
+
+        # Step 2: Add new tracking numbers to database (async client - the
+        # insert batches overlap instead of blocking the event loop)
         logging.info("�� Adding new tracking numbers to database...")
-        new_count = db.add_new_tracking_numbers(excel_data)
+        new_count = await db.add_new_tracking_numbers_async(excel_frame)
         logging.info(f"✓ Added {new_count} new tracking numbers")
-        
-        # Step 3: Get active tracking numbers that need updates
+
+        # Step 3: Get active tracking numbers that need updates (columnar
+        # view - the fan-out below only needs the tracking_number column)
         today = date.today()
-        active_records = db.get_active_tracking_numbers(max_pickup_date=today)
-        logging.info(f"📦 Found {len(active_records)} active shipments to update")
-        
-        if not active_records:
+        active_columns = await db.get_active_tracking_numbers_columnar_async(max_pickup_date=today)
+        tracking_numbers = active_columns['tracking_number']
+        logging.info(f"📦 Found {len(tracking_numbers)} active shipments to update")
+
+        if not tracking_numbers:
             logging.info("✅ No active shipments to update")
             return
-        
-        # Step 4: Get UPS tracking data
-        tracking_numbers = [record['tracking_number'] for record in active_records]
+
+        # Legacy dict view for the per-shipment lookups in the processing
+        # workers below - built once, only when there is work to do
+        excel_data = excel_frame.to_dict(orient='index')
+
+        # Steps 4+5 pipelined: UPS responses stream through a raw queue into
+        # processing workers, which feed an update queue drained by Table
+        # Storage writers - UPS fetches, processing, and DB writes overlap
         logging.info(f"🔍 Querying UPS API for {len(tracking_numbers)} tracking numbers...")
-        
-        ups_data = ups_tracker.get_tracking_data(tracking_numbers)
-        logging.info(f"✓ Received {len(ups_data)} responses from UPS")
-        
-        # Step 5: Process and update each tracking number
-        success_count = 0
+
+        num_workers = 8
+        raw_queue: asyncio.Queue = asyncio.Queue(maxsize=200)
+        update_queue: asyncio.Queue = asyncio.Queue(maxsize=200)
         error_count = 0
-        
-        for tracking_number, raw_data in ups_data.items():
-            try:
-                # Get corresponding Excel data
-                excel_record = excel_data.get(tracking_number, {})
-                
-                # Process the UPS data
-                processed_data = data_processor.process_tracking_data(
-                    tracking_number=tracking_number,
-                    raw_data=raw_data,
-                    excel_data=excel_record
-                )
-                
-                # Update database
-                db.update_tracking_record(tracking_number, processed_data)
-                success_count += 1
-                
-            except Exception as e:
-                logging.error(f"❌ Error processing {tracking_number}: {str(e)}")
-                error_count += 1
+
+        async def process_worker() -> None:
+            nonlocal error_count
+            while True:
+                item = await raw_queue.get()
+                try:
+                    if item is None:
+                        return
+                    tracking_number, raw_data = item
+
+                    try:
+                        # Get corresponding Excel data
+                        excel_record = excel_data.get(tracking_number, _EMPTY)
+
+                        # Process the UPS data
+                        processed_data = data_processor.process_tracking_data(
+                            tracking_number=tracking_number,
+                            raw_data=raw_data,
+                            excel_data=excel_record
+                        )
+                        await update_queue.put((tracking_number, processed_data))
+
+                    except Exception as e:
+                        # Lazy %-formatting: the message is only built if the
+                        # record is actually emitted
+                        logging.error("❌ Error processing %s: %s", tracking_number, e)
+                        error_count += 1
+                finally:
+                    raw_queue.task_done()
+
+        producer = asyncio.create_task(
+            ups_tracker.stream_tracking_data(tracking_numbers, raw_queue)
+        )
+        updater = asyncio.create_task(
+            db.update_tracking_records_from_queue(update_queue, num_consumers=num_workers)
+        )
+        workers = [asyncio.create_task(process_worker()) for _ in range(num_workers)]
+
+        try:
+            # Wait for all UPS responses, then wind down the pipeline stages
+            fetched = await producer
+            logging.info(f"✓ Received {fetched} responses from UPS")
+
+            for _ in range(num_workers):
+                await raw_queue.put(None)
+            await asyncio.gather(*workers)
+
+            for _ in range(num_workers):
+                await update_queue.put(None)
+            success_count, update_errors = await updater
+            error_count += update_errors
+        except BaseException:
+            # A failed stage must not strand the others on queue.get() -
+            # in a warm worker every leaked run keeps its tasks, queues and
+            # the updater's storage session alive forever
+            stages = [producer, updater, *workers]
+            for stage in stages:
+                stage.cancel()
+            await asyncio.gather(*stages, return_exceptions=True)
+            raise
         
         # Final summary
         logging.info(f"✅ Tracking update completed:")
@@ -95,72 +196,176 @@ def hourly_tracking_update(myTimer: func.TimerRequest) -> None:
 @app.route(route="health", methods=["GET"])
 def health_check(req: func.HttpRequest) -> func.HttpResponse:
     """Health check endpoint - returns database stats"""
-    
+
+    # One timestamp per request, reused by success and error paths
+    timestamp = datetime.now().isoformat()
+
     try:
-        db = TableStorageManager()
+        db = get_db()
         stats = db.get_database_stats()
-        
+
         response_data = {
             "status": "healthy",
-            "timestamp": datetime.now().isoformat(),
+            "timestamp": timestamp,
             "database": stats,
             "version": "1.0.0"
         }
         
         return func.HttpResponse(
-            body=json.dumps(response_data, indent=2),
+            body=_dump(response_data),
             status_code=200,
             mimetype="application/json"
         )
-        
+
     except Exception as e:
         logging.error(f"Health check failed: {str(e)}")
         error_response = {
             "status": "unhealthy",
-            "timestamp": datetime.now().isoformat(),
+            "timestamp": timestamp,
             "error": str(e)
         }
         
         return func.HttpResponse(
-            body=json.dumps(error_response, indent=2),
+            body=_dump(error_response),
             status_code=500,
             mimetype="application/json"
         )
 
 
+# Keep strong references to background jobs so the loop doesn't drop them
+_background_tasks = set()
+
+
+async def _run_manual_update(job_id: str) -> None:
+    """Run the tracking update in the background for a manual trigger"""
+    try:
+        await hourly_tracking_update(None)
+        logging.info(f"✓ Manual update {job_id} completed")
+    except Exception as e:
+        logging.error(f"❌ Manual update {job_id} failed: {str(e)}")
+
+
 @app.function_name(name="manual_trigger")
 @app.route(route="trigger", methods=["POST"])
-def manual_trigger(req: func.HttpRequest) -> func.HttpResponse:
-    """Manual trigger for testing - runs the tracking update immediately"""
-    
+async def manual_trigger(req: func.HttpRequest) -> func.HttpResponse:
+    """Manual trigger for testing - starts the tracking update in the background"""
+
+    timestamp = datetime.now().isoformat()
+
     try:
         logging.info("🔧 Manual trigger initiated")
+
+        # Dispatch the update on the event loop instead of holding the HTTP
+        # connection open for the whole (multi-minute) run
+        job_id = uuid.uuid4().hex
+        task = asyncio.create_task(_run_manual_update(job_id))
+        _background_tasks.add(task)
+        task.add_done_callback(_background_tasks.discard)
+
+        response_data = {
+            "status": "accepted",
+            "message": "Tracking update started",
+            "job_id": job_id,
+            "timestamp": timestamp
+        }
+
+        return func.HttpResponse(
+            body=_dump(response_data),
+            status_code=202,
+            mimetype="application/json"
+        )
+
+    except Exception as e:
+        logging.error(f"Manual trigger failed: {str(e)}")
+        error_response = {
+            "status": "error",
+            "message": str(e),
+            "timestamp": timestamp
+        }
         
-        # Run the update function
-        hourly_tracking_update(None)
-        
+        return func.HttpResponse(
+            body=_dump(error_response),
+            status_code=500,
+            mimetype="application/json"
+        )
+
+
+@app.function_name(name="agent_query")
+@app.route(route="agent/query", methods=["POST"])
+def agent_query(req: func.HttpRequest) -> func.HttpResponse:
+    """Agent query endpoint - search shipments by destination/status/dates"""
+
+    try:
+        params = req.get_json()
+    except ValueError:
+        params = {}
+
+    timestamp = datetime.now().isoformat()
+
+    try:
+        query = AgentQuery.from_params(params)
+    except (TypeError, ValueError) as e:
+        return func.HttpResponse(
+            body=_dump({"status": "error", "message": f"Invalid query: {e}", "timestamp": timestamp}),
+            status_code=400,
+            mimetype="application/json"
+        )
+
+    query_summary = query.describe()
+    logging.info(f"🔎 Agent query: {query_summary or 'all shipments'}")
+
+    try:
+        db = get_db()
+
+        # A bare tracking number is a point lookup - skip the query path
+        # (and its scan) entirely and serve it via the cached get_entity
+        if query.is_point_lookup():
+            try:
+                shipments = [db.get_entity_cached(query.tracking_number)]
+            except Exception:
+                shipments = []
+
+            response_data = {
+                "status": "success",
+                "count": len(shipments),
+                "query": query_summary,
+                "shipments": shipments,
+                "timestamp": timestamp
+            }
+
+            return func.HttpResponse(
+                body=_dump(response_data),
+                status_code=200,
+                mimetype="application/json"
+            )
+
+        processor = AgentQueryProcessor(db)
+        shipments = processor.query_shipments(**asdict(query))
+
         response_data = {
             "status": "success",
-            "message": "Tracking update completed successfully",
-            "timestamp": datetime.now().isoformat()
+            "count": len(shipments),
+            "query": query_summary,
+            "shipments": shipments,
+            "timestamp": timestamp
         }
-        
+
         return func.HttpResponse(
-            body=json.dumps(response_data, indent=2),
+            body=_dump(response_data),
             status_code=200,
             mimetype="application/json"
         )
-        
+
     except Exception as e:
-        logging.error(f"Manual trigger failed: {str(e)}")
+        logging.error(f"Agent query failed: {str(e)}")
         error_response = {
             "status": "error",
             "message": str(e),
-            "timestamp": datetime.now().isoformat()
+            "timestamp": timestamp
         }
-        
+
         return func.HttpResponse(
-            body=json.dumps(error_response, indent=2),
+            body=_dump(error_response),
             status_code=500,
             mimetype="application/json"
         )
@@ -175,20 +380,17 @@ def get_tracking_status(req: func.HttpRequest) -> func.HttpResponse:
     
     if not tracking_number:
         return func.HttpResponse(
-            body=json.dumps({"error": "Tracking number required"}),
+            body=_dump({"error": "Tracking number required"}),
             status_code=400,
             mimetype="application/json"
         )
     
     try:
-        db = TableStorageManager()
-        entity = db.table_client.get_entity(
-            partition_key="tracking",
-            row_key=tracking_number
-        )
-        
+        db = get_db()
+        entity = db.get_entity_cached(tracking_number)
+
         return func.HttpResponse(
-            body=json.dumps(dict(entity), indent=2, default=str),
+            body=_dump(entity),
             status_code=200,
             mimetype="application/json"
         )
@@ -196,7 +398,7 @@ def get_tracking_status(req: func.HttpRequest) -> func.HttpResponse:
     except Exception as e:
         logging.error(f"Error retrieving tracking status: {str(e)}")
         return func.HttpResponse(
-            body=json.dumps({"error": "Tracking number not found"}),
+            body=_dump({"error": "Tracking number not found"}),
             status_code=404,
             mimetype="application/json"
         )
@@ -0,0 +1,506 @@
+"""
+Agent Query Processor - Shipment search for the agent query endpoint
+Pushes exact predicates into Table Storage and applies the rest locally
+"""
+
+import functools
+import logging
+import queue
+import re
+import threading
+from dataclasses import dataclass, fields, asdict
+from datetime import datetime, date, timedelta
+from typing import Dict, Any, Iterator, List, Optional
+
+from modules.data_processor import INTERNAL_STATUS_LABELS
+
+# Columns the formatter and local filters actually read - projected
+# server-side so the service doesn't ship unused properties
+_QUERY_COLUMNS = [
+    'RowKey',
+    'tracking_number',
+    'destination',
+    'reference_number',
+    'shipper_info',
+    'planned_pickup_date',
+    'internal_status',
+    'ups_status',
+    'estimated_delivery_date',
+    'actual_delivery_date',
+    'actual_delivery_time',
+    'days_until_pickup',
+    'days_since_pickup',
+    'last_updated'
+]
+
+# Lowercased status -> canonical bucket name in the StatusIndex; a query
+# whose status matches one of these exactly can be served from a single
+# index partition instead of a table scan
+_STATUS_BUCKETS = {label.lower(): label for label in INTERNAL_STATUS_LABELS}
+
+# Relative date keywords agents may send, as offsets from "today"
+_RELATIVE_KEYWORDS = {
+    'today': timedelta(0),
+    'yesterday': timedelta(days=-1)
+}
+
+
+# Shape classifiers for the supported date formats - one match decides the
+# parse path instead of walking a strptime cascade through ValueErrors
+_ISO_DATETIME_RE = re.compile(r'^\d{4}-\d{2}-\d{2}[T ]\d{2}:\d{2}:\d{2}')
+_ISO_DATE_RE = re.compile(r'^(\d{4})-(\d{2})-(\d{2})$')
+_EU_DATE_RE = re.compile(r'^(\d{2})-(\d{2})-(\d{4})$')
+
+
+@functools.lru_cache(maxsize=8192)
+def _parse_date_cached(date_str: str) -> Optional[datetime]:
+    """
+    Parse a static-format date string into a datetime (memoized)
+
+    The same ISO timestamps recur across thousands of records and repeated
+    queries, so each distinct string is classified and parsed once.
+    Relative keywords are resolved by the caller - they depend on "today"
+    and must not be cached.
+    """
+    if _ISO_DATETIME_RE.match(date_str):
+        try:
+            parsed = datetime.fromisoformat(date_str[:26])
+        except ValueError:
+            return None
+        # Offset-bearing inputs (the [:26] slice only strips the offset
+        # when microseconds are present) must not come back tz-aware -
+        # all record dates are naive, and naive-vs-aware comparison raises
+        return parsed.replace(tzinfo=None)
+
+    match = _ISO_DATE_RE.match(date_str)
+    if match:
+        year, month, day = map(int, match.groups())
+    else:
+        match = _EU_DATE_RE.match(date_str)
+        if not match:
+            return None
+        day, month, year = map(int, match.groups())
+
+    try:
+        return datetime(year, month, day)
+    except ValueError:
+        return None
+
+_PAGE_END = object()
+
+
+def _prefetch_pages(pages) -> Iterator[Any]:
+    """
+    Yield entities from a page iterator, prefetching the next page in a
+    background thread
+
+    While the consumer filters the current page, the producer thread is
+    already waiting on the next page's network round-trip, so I/O overlaps
+    with CPU instead of serializing with it. Closing the generator early
+    (e.g. at the result limit) signals the producer to stop fetching.
+    """
+    page_queue: queue.Queue = queue.Queue(maxsize=2)
+    stop = threading.Event()
+
+    def produce() -> None:
+        item: Any = _PAGE_END
+        try:
+            for page in pages:
+                if stop.is_set():
+                    return
+                item = list(page)
+                while not stop.is_set():
+                    try:
+                        page_queue.put(item, timeout=0.1)
+                        break
+                    except queue.Full:
+                        continue
+            item = _PAGE_END
+        except Exception as e:
+            item = e
+        while not stop.is_set():
+            try:
+                page_queue.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    producer = threading.Thread(target=produce, daemon=True)
+    producer.start()
+
+    try:
+        while True:
+            item = page_queue.get()
+            if item is _PAGE_END:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield from item
+    finally:
+        stop.set()
+
+
+@functools.lru_cache(maxsize=4096)
+def _lower_cached(value: str) -> str:
+    """
+    Lowercase a status string, memoized
+
+    Statuses draw from a small vocabulary repeated across thousands of
+    records, so each distinct value is lowercased (and allocated) once.
+    """
+    return value.lower()
+
+
+@dataclass(slots=True)
+class ShipmentView:
+    """
+    Agent-facing view of one shipment
+
+    Slotted dataclass instead of a per-record dict: no hash table per
+    instance, so construction is faster and memory is ~3x lower across a
+    large result set. orjson serializes dataclasses natively, so these go
+    straight into the HTTP response body.
+    """
+    tracking_number: str = ''
+    destination: str = ''
+    reference_number: str = ''
+    shipper_info: str = ''
+    planned_pickup_date: str = ''
+    internal_status: str = ''
+    ups_status: str = ''
+    estimated_delivery_date: str = ''
+    actual_delivery_date: str = ''
+    actual_delivery_time: str = ''
+    days_until_pickup: int = 0
+    days_since_pickup: int = 0
+    last_updated: str = ''
+
+
+@dataclass
+class AgentQuery:
+    """Validated agent query parameters, parsed once per request"""
+    destination: Optional[str] = None
+    tracking_number: Optional[str] = None
+    reference_number: Optional[str] = None
+    status: Optional[str] = None
+    date_from: Optional[str] = None
+    date_to: Optional[str] = None
+    limit: int = 100
+
+    @classmethod
+    def from_params(cls, params: Dict[str, Any]) -> "AgentQuery":
+        """Build a query from a request payload, ignoring unknown keys"""
+        # Well-formed JSON isn't necessarily an object - reject arrays and
+        # scalars here so the handler's 400-guard catches them
+        if not isinstance(params, dict):
+            raise ValueError("query payload must be a JSON object")
+
+        known = {f.name for f in fields(cls)}
+        data = {k: v for k, v in params.items() if k in known and v is not None}
+
+        if 'limit' in data:
+            data['limit'] = int(data['limit'])
+
+        return cls(**data)
+
+    def describe(self) -> str:
+        """Human-readable summary of the set filters, for logging"""
+        return " ".join(
+            f"{name}={value}"
+            for name, value in asdict(self).items()
+            if value is not None and name != 'limit'
+        )
+
+    def is_point_lookup(self) -> bool:
+        """True when only a tracking number is given - no scan needed"""
+        return bool(self.tracking_number) and not any([
+            self.destination,
+            self.reference_number,
+            self.status,
+            self.date_from,
+            self.date_to
+        ])
+
+
+class AgentQueryProcessor:
+    def __init__(self, storage):
+        """
+        Initialize query processor
+
+        Args:
+            storage: TableStorageManager instance to query against
+        """
+        self.storage = storage
+
+    def iter_shipments(
+        self,
+        destination: Optional[str] = None,
+        tracking_number: Optional[str] = None,
+        reference_number: Optional[str] = None,
+        status: Optional[str] = None,
+        date_from: Optional[str] = None,
+        date_to: Optional[str] = None,
+        limit: int = 100
+    ) -> Iterator[ShipmentView]:
+        """
+        Yield formatted shipments matching the given criteria, one at a time
+
+        Exact predicates (tracking number) are pushed into the Table
+        Storage query so the service only returns candidate rows; substring
+        and date-range criteria are applied locally because Table Storage
+        OData only supports comparison operators, not string functions.
+
+        The underlying query_entities iterator paginates lazily, so
+        stopping at `limit` also stops fetching pages from the service, and
+        at most one formatted record is alive per step until the caller
+        collects them.
+        """
+
+        # Parse the date bounds once per query, not once per record
+        from_date = self._parse_date(date_from) if date_from else None
+        to_date = self._parse_date(date_to) if date_to else None
+
+        # Lowercase the criteria once outside the loop and apply the checks
+        # inline, cheapest and most selective first (reference and status
+        # before destination, date parsing last) - rejection is the common
+        # case, so the expensive checks should rarely run
+        ref_l = reference_number.lower() if reference_number else None
+        status_l = status.lower() if status else None
+        dest_l = destination.lower() if destination else None
+
+        status_bucket = _STATUS_BUCKETS.get(status_l) if status_l else None
+        if status_bucket and not tracking_number:
+            # The status names an index bucket: scan that single partition
+            # of the StatusIndex instead of the whole tracking table. The
+            # exact partition match replaces the substring status check;
+            # the remaining predicates still apply below.
+            logging.info(f"Serving status query from index bucket: {status_bucket}")
+            entities = self.storage.query_status_bucket(status_bucket)
+            status_l = None
+        else:
+            filter_str = self._build_odata(tracking_number, status_bucket)
+            if status_bucket:
+                # Exact status equality was pushed server-side
+                status_l = None
+            logging.info(f"Querying shipments with filter: {filter_str}")
+
+            # Prefetch the next page on a background thread while this
+            # thread filters the current one - network latency overlaps
+            # with the predicate work instead of adding to it
+            entities = _prefetch_pages(
+                self.storage.query_tracking_records(
+                    filter_str,
+                    select=_QUERY_COLUMNS,
+                    results_per_page=min(max(limit, 1), 1000)
+                ).by_page()
+            )
+
+        matched = 0
+        for record in entities:
+            if ref_l is not None and ref_l not in record.get('reference_number', '').lower():
+                continue
+            if status_l is not None and (
+                status_l not in (record.get('_internal_status_lower')
+                                 or _lower_cached(record.get('internal_status', '')))
+                and status_l not in (record.get('_ups_status_lower')
+                                     or _lower_cached(record.get('ups_status', '')))
+            ):
+                continue
+            if dest_l is not None and dest_l not in record.get('destination', '').lower():
+                continue
+            if (from_date or to_date) and not self._matches_date_range(record, from_date, to_date):
+                continue
+
+            yield self._format_record(record)
+
+            matched += 1
+            if matched >= limit:
+                return
+
+    def query_shipments(self, **criteria) -> List[ShipmentView]:
+        """
+        Query shipments matching the given criteria
+
+        List-collecting wrapper around iter_shipments; accepts the same
+        keyword arguments.
+
+        Returns:
+            List of ShipmentView records (at most `limit`)
+        """
+        return list(self.iter_shipments(**criteria))
+
+    def filter_records_vectorized(
+        self,
+        records: List[Dict[str, Any]],
+        destination: Optional[str] = None,
+        reference_number: Optional[str] = None,
+        status: Optional[str] = None,
+        date_from: Optional[str] = None,
+        date_to: Optional[str] = None,
+        limit: int = 100
+    ) -> List[ShipmentView]:
+        """
+        Filter an already-materialized record list with pandas string ops
+
+        Batch counterpart to the per-record checks in iter_shipments: all
+        predicates are applied as vectorized boolean masks in C instead of
+        N x P Python-level calls. Worth it when the caller already holds
+        the full record set (e.g. a cached snapshot); the streaming path
+        remains the default because it stops fetching pages at `limit`.
+        """
+        import pandas as pd
+
+        if not records:
+            return []
+
+        df = pd.DataFrame.from_records(records)
+        mask = pd.Series(True, index=df.index)
+
+        def _contains(column: str, needle: str) -> "pd.Series":
+            if column not in df.columns:
+                return pd.Series(False, index=df.index)
+            return df[column].astype('string').str.contains(
+                needle, case=False, regex=False, na=False
+            )
+
+        if reference_number:
+            mask &= _contains('reference_number', reference_number)
+        if status:
+            mask &= _contains('internal_status', status) | _contains('ups_status', status)
+        if destination:
+            mask &= _contains('destination', destination)
+
+        if date_from or date_to:
+            from_date = self._parse_date(date_from) if date_from else None
+            to_date = self._parse_date(date_to) if date_to else None
+
+            # A record matches when any of its date fields falls in range,
+            # mirroring _matches_date_range
+            date_mask = pd.Series(False, index=df.index)
+            for field in ('last_updated', 'actual_delivery_date',
+                          'estimated_delivery_date', 'planned_pickup_date'):
+                if field not in df.columns:
+                    continue
+                parsed = pd.to_datetime(df[field], errors='coerce')
+                in_range = parsed.notna()
+                if from_date:
+                    in_range &= parsed >= from_date
+                if to_date:
+                    in_range &= parsed <= to_date
+                date_mask |= in_range
+            mask &= date_mask
+
+        return [
+            self._format_record(record)
+            for record in df.loc[mask].head(limit).to_dict('records')
+        ]
+
+    @staticmethod
+    def _escape_odata(value: str) -> str:
+        """Escape a string literal for an OData filter (double the quotes)"""
+        return value.replace("'", "''")
+
+    def _build_odata(
+        self,
+        tracking_number: Optional[str] = None,
+        status_bucket: Optional[str] = None
+    ) -> str:
+        """
+        Build the server-side OData filter for the pushable predicates
+
+        Only exact equality is pushable: Table Storage OData supports
+        comparison operators but no string functions, so substring criteria
+        stay local as residual predicates. The service AND-combines the
+        clauses itself - RowKey is served from the index, the rest filter
+        rows before they're transferred.
+        """
+        clauses = ["PartitionKey eq 'tracking'"]
+
+        if tracking_number:
+            clauses.append(f"RowKey eq '{self._escape_odata(tracking_number)}'")
+        if status_bucket:
+            clauses.append(f"internal_status eq '{self._escape_odata(status_bucket)}'")
+
+        return " and ".join(clauses)
+
+    def _matches_date_range(
+        self,
+        record: Dict,
+        from_date: Optional[datetime],
+        to_date: Optional[datetime]
+    ) -> bool:
+        """Check whether any of the record's dates fall inside the range"""
+
+        date_fields = [
+            'last_updated',
+            'actual_delivery_date',
+            'estimated_delivery_date',
+            'planned_pickup_date'
+        ]
+
+        for field in date_fields:
+            # Cache the parsed datetime on the record itself, so a record
+            # that is checked again (cached entities, repeated queries over
+            # the same snapshot) never re-parses the same field
+            cache_key = '_' + field + '_dt'
+            record_date = record.get(cache_key)
+
+            if record_date is None:
+                value = record.get(field)
+                if not value:
+                    continue
+
+                record_date = self._parse_date(str(value))
+                if record_date is None:
+                    continue
+
+                record[cache_key] = record_date
+
+            if from_date and record_date < from_date:
+                continue
+            if to_date and record_date > to_date:
+                continue
+
+            return True
+
+        return False
+
+    def _parse_date(self, date_str: str) -> Optional[datetime]:
+        """Parse a date string or relative keyword into a datetime"""
+
+        if not date_str:
+            return None
+
+        # Literal dates always start with a digit, so only strings that
+        # open alphabetically take the relative-keyword path - static
+        # dates never pay the lower() + lookup + today() detour
+        if date_str[0].isalpha():
+            return self._resolve_relative(date_str)
+
+        return _parse_date_cached(date_str)
+
+    @staticmethod
+    def _resolve_relative(date_str: str) -> Optional[datetime]:
+        """Resolve a relative keyword like 'today' against the current date"""
+        offset = _RELATIVE_KEYWORDS.get(date_str.lower())
+        if offset is None:
+            return None
+        return datetime.combine(date.today() + offset, datetime.min.time())
+
+    def _format_record(self, record: Dict) -> ShipmentView:
+        """Format a raw entity into the agent-facing response shape"""
+        return ShipmentView(
+            record.get('tracking_number') or record.get('RowKey', ''),
+            record.get('destination', ''),
+            record.get('reference_number', ''),
+            record.get('shipper_info', ''),
+            record.get('planned_pickup_date') or '',
+            record.get('internal_status', ''),
+            record.get('ups_status', ''),
+            record.get('estimated_delivery_date') or '',
+            record.get('actual_delivery_date') or '',
+            record.get('actual_delivery_time') or '',
+            record.get('days_until_pickup', 0),
+            record.get('days_since_pickup', 0),
+            record.get('last_updated') or ''
+        )
@@ -4,9 +4,53 @@ Determines internal status based on UPS codes and business rules
 """
 
 import logging
+import re
+import sys
 from typing import Dict, Any, Optional
 from datetime import datetime, date
 
+# Status keywords in priority order (highest first), compiled into one
+# alternation so a description is scanned once instead of once per keyword.
+# The matched branch's group number maps back into _STATUS_LABELS.
+_STATUS_PATTERNS = [
+    (r'delivered', 'Delivered'),
+    (r'delivery attempt|attempted', 'Delivery Attempt Failed'),
+    (r'out for delivery', 'Out for Delivery'),
+    (r'exception', 'Exception - Action Required'),
+    (r'held|hold', 'Held at Facility'),
+    (r'in transit', 'In Transit'),
+    (r'arriv(?:ed|al)', 'Arrived at Facility'),
+    (r'origin|picked up|pickup', 'Picked Up - Origin'),
+    (r'manifest', 'Manifest Received'),
+    (r'label|created', 'Label Created - Not Scanned'),
+]
+
+_STATUS_LABELS = [label for _, label in _STATUS_PATTERNS]
+_STATUS_RE = re.compile('|'.join(f'({pattern})' for pattern, _ in _STATUS_PATTERNS))
+
+# Full vocabulary of internal statuses this processor can emit (the
+# classifier labels plus the fixed fallback/error statuses) - consumers
+# use it to recognize status values that map to an index bucket
+INTERNAL_STATUS_LABELS = tuple(_STATUS_LABELS) + (
+    'Pending API Call',
+    'API Error',
+    'No Tracking Data',
+    'Label Created - Not in System',
+    'In Transit - Status Unknown',
+    'Data Processing Error',
+    'Unknown Status',
+)
+
+# Priority ranks (1-based indexes into _STATUS_LABELS) for the checks that
+# look at the status type or code instead of the description
+_RANK_OUT_FOR_DELIVERY = 3
+_RANK_EXCEPTION = 4
+_RANK_IN_TRANSIT = 6
+
+# UPS status codes that mean out-for-delivery - frozenset membership
+# instead of equality chains, extensible without touching the logic
+_OUT_FOR_DELIVERY_CODES = frozenset({'od'})
+
 class DataProcessor:
     def __init__(self):
         """Initialize data processor"""
@@ -142,10 +186,16 @@ class DataProcessor:
                 ups_status_str = 'Status Available'
             
             logging.info(f"✓ Processed {tracking_number}: {internal_status} | {ups_status_str}")
-            
+
+            # Statuses come from a small fixed vocabulary - interning them
+            # (and a lowercased copy for case-insensitive consumers) means
+            # one allocation per distinct value instead of one per record,
+            # and equality checks become pointer compares
             return {
                 'ups_status': ups_status_str,
-                'internal_status': internal_status,
+                'internal_status': sys.intern(internal_status),
+                '_internal_status_lower': sys.intern(internal_status.lower()),
+                '_ups_status_lower': sys.intern(ups_status_str.lower()),
                 'estimated_delivery_date': estimated_delivery,
                 'actual_delivery_date': actual_delivery_date,
                 'actual_delivery_time': actual_delivery_time
@@ -188,43 +238,32 @@ class DataProcessor:
         type_lower = status_type.lower() if status_type else ''
         desc = status_description.lower() if status_description else ''
         
-        # Priority 1: Delivered
-        if actual_delivery_date or 'delivered' in desc or 'delivered' in type_lower:
+        # Delivered outranks everything, regardless of the description
+        if actual_delivery_date or 'delivered' in type_lower:
             return 'Delivered'
-        
-        # Priority 2: Delivery attempt failed
-        if 'delivery attempt' in desc or 'attempted' in desc:
-            return 'Delivery Attempt Failed'
-        
-        # Priority 3: Out for delivery
-        if 'out for delivery' in desc or code == 'od':
-            return 'Out for Delivery'
-        
-        # Priority 4: Exception / Issues
-        if 'exception' in desc or 'exception' in type_lower:
-            return 'Exception - Action Required'
-        
-        if 'held' in desc or 'hold' in desc:
-            return 'Held at Facility'
-        
-        # Priority 5: In transit
-        if 'in transit' in desc or 'transit' in type_lower:
-            return 'In Transit'
-        
-        if 'arrived' in desc or 'arrival' in desc:
-            return 'Arrived at Facility'
-        
-        # Priority 6: Origin / Pickup
-        if 'origin' in desc or 'picked up' in desc or 'pickup' in desc:
-            return 'Picked Up - Origin'
-        
-        if 'manifested' in desc or 'manifest' in desc:
-            return 'Manifest Received'
-        
-        # Priority 7: Label created but not scanned
-        if 'label' in desc or 'created' in desc:
-            return 'Label Created - Not Scanned'
-        
+
+        # One pass over the description instead of a chain of substring
+        # checks; keep the best (lowest) matched priority since the first
+        # match by position is not necessarily the highest-priority one
+        best = None
+        for match in _STATUS_RE.finditer(desc):
+            rank = match.lastindex
+            if best is None or rank < best:
+                best = rank
+                if best == 1:
+                    break
+
+        # Fold in the type/code-based checks at their cascade priorities
+        if code in _OUT_FOR_DELIVERY_CODES and (best is None or best > _RANK_OUT_FOR_DELIVERY):
+            best = _RANK_OUT_FOR_DELIVERY
+        if 'exception' in type_lower and (best is None or best > _RANK_EXCEPTION):
+            best = _RANK_EXCEPTION
+        if 'transit' in type_lower and (best is None or best > _RANK_IN_TRANSIT):
+            best = _RANK_IN_TRANSIT
+
+        if best is not None:
+            return _STATUS_LABELS[best - 1]
+
         # Default: Unknown with some info
         if status_code or status_description:
             return f'In Transit - {status_code}' if status_code else 'In Transit - Status Unknown'
@@ -5,6 +5,7 @@ Maintains the 12-column structure from the existing application
 
 import sqlite3
 import logging
+import threading
 from datetime import datetime, date
 from typing import List, Dict, Optional, Any
 import os
@@ -13,20 +14,44 @@ class DatabaseManager:
     def __init__(self, db_path: str = "tracking_data.db"):
         """Initialize database connection"""
         self.db_path = db_path
+
+        # One long-lived connection per manager - connecting per call
+        # re-parses the DB header and restarts with a cold page cache.
+        # The lock serializes access when callers share the manager
+        # across threads.
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+
         self._create_tables()
-    
+
+    def close(self) -> None:
+        """Close the underlying connection"""
+        with self._lock:
+            self._conn.close()
+
     def _create_tables(self):
         """Create tracking table with 12-column structure"""
-        
-        conn = sqlite3.connect(self.db_path)
+
+        conn = self._conn
         cursor = conn.cursor()
-        
+
+        # WAL allows concurrent readers during writes and, with
+        # synchronous=NORMAL, avoids an fsync per commit
+        cursor.execute('PRAGMA journal_mode=WAL')
+        cursor.execute('PRAGMA synchronous=NORMAL')
+        cursor.execute('PRAGMA temp_store=MEMORY')
+        cursor.execute('PRAGMA cache_size=-65536')
+
         # Create main tracking table (12 columns matching existing app)
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS tracking_data (
                 -- Columns 1-5: Excel data (original input)
                 tracking_number TEXT PRIMARY KEY,
-                planned_pickup_date DATE NOT NULL,
+                -- Proleptic Gregorian ordinal (date.toordinal()) - integer
+                -- compares in queries and integer day math in updates,
+                -- instead of TEXT date parsing
+                planned_pickup_date INTEGER NOT NULL,
                 destination TEXT,
                 reference_number TEXT,
                 shipper_info TEXT,
@@ -62,22 +87,128 @@ class DatabaseManager:
             )
         ''')
         
+        # One-time, idempotent migration for databases created when the
+        # column held ISO text: julianday minus the ordinal epoch offset
+        # converts each text date to its toordinal() value
+        cursor.execute('''
+            UPDATE tracking_data
+            SET planned_pickup_date = CAST(julianday(planned_pickup_date) - 1721424.5 AS INTEGER)
+            WHERE typeof(planned_pickup_date) = 'text'
+        ''')
+
         # Create indexes for performance
         cursor.execute('''
-            CREATE INDEX IF NOT EXISTS idx_planned_pickup 
+            CREATE INDEX IF NOT EXISTS idx_planned_pickup
             ON tracking_data(planned_pickup_date)
         ''')
         
         cursor.execute('''
-            CREATE INDEX IF NOT EXISTS idx_internal_status 
+            CREATE INDEX IF NOT EXISTS idx_internal_status
             ON tracking_data(internal_status)
         ''')
-        
+
+        # Partial index over active (non-delivered) rows only - matches the
+        # WHERE clause of get_active_tracking_numbers so that query becomes
+        # an index range scan instead of a full table scan
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_active_pickup
+            ON tracking_data(planned_pickup_date)
+            WHERE internal_status IS NULL OR LOWER(internal_status) NOT LIKE '%delivered%'
+        ''')
+
+        # Full-text index over the searchable columns, kept in sync by
+        # triggers, so text search hits an inverted index instead of
+        # LIKE-scanning the whole table. FTS5 is compiled into most SQLite
+        # builds but not all - search_shipments degrades to LIKE without it.
+        try:
+            fts_exists = cursor.execute('''
+                SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'tracking_fts'
+            ''').fetchone() is not None
+
+            cursor.execute('''
+                CREATE VIRTUAL TABLE IF NOT EXISTS tracking_fts USING fts5(
+                    tracking_number UNINDEXED,
+                    destination,
+                    reference_number,
+                    internal_status,
+                    ups_status,
+                    content='tracking_data',
+                    content_rowid='rowid'
+                )
+            ''')
+            cursor.execute('''
+                CREATE TRIGGER IF NOT EXISTS tracking_fts_ai
+                AFTER INSERT ON tracking_data BEGIN
+                    INSERT INTO tracking_fts(
+                        rowid, tracking_number, destination,
+                        reference_number, internal_status, ups_status
+                    ) VALUES (
+                        new.rowid, new.tracking_number, new.destination,
+                        new.reference_number, new.internal_status, new.ups_status
+                    );
+                END
+            ''')
+            cursor.execute('''
+                CREATE TRIGGER IF NOT EXISTS tracking_fts_ad
+                AFTER DELETE ON tracking_data BEGIN
+                    INSERT INTO tracking_fts(
+                        tracking_fts, rowid, tracking_number, destination,
+                        reference_number, internal_status, ups_status
+                    ) VALUES (
+                        'delete', old.rowid, old.tracking_number, old.destination,
+                        old.reference_number, old.internal_status, old.ups_status
+                    );
+                END
+            ''')
+            cursor.execute('''
+                CREATE TRIGGER IF NOT EXISTS tracking_fts_au
+                AFTER UPDATE ON tracking_data BEGIN
+                    INSERT INTO tracking_fts(
+                        tracking_fts, rowid, tracking_number, destination,
+                        reference_number, internal_status, ups_status
+                    ) VALUES (
+                        'delete', old.rowid, old.tracking_number, old.destination,
+                        old.reference_number, old.internal_status, old.ups_status
+                    );
+                    INSERT INTO tracking_fts(
+                        rowid, tracking_number, destination,
+                        reference_number, internal_status, ups_status
+                    ) VALUES (
+                        new.rowid, new.tracking_number, new.destination,
+                        new.reference_number, new.internal_status, new.ups_status
+                    );
+                END
+            ''')
+
+            # One-time backfill for databases that predate the index: the
+            # external-content table starts empty, so existing rows would
+            # never match - and the UPDATE trigger's 'delete' for a
+            # never-indexed row corrupts the index outright
+            if not fts_exists:
+                cursor.execute("INSERT INTO tracking_fts(tracking_fts) VALUES('rebuild')")
+
+            self._fts_enabled = True
+        except sqlite3.OperationalError as e:
+            logging.warning(f"FTS5 unavailable, text search will scan: {e}")
+            self._fts_enabled = False
+
         conn.commit()
-        conn.close()
-        
+
         logging.info("✓ Database tables initialized")
     
+    @staticmethod
+    def _to_ordinal(value: Any) -> Optional[int]:
+        """Coerce a date, ISO string, or stored int to a date ordinal"""
+        if value is None:
+            return None
+        if isinstance(value, int):
+            return value
+        if isinstance(value, datetime):
+            return value.date().toordinal()
+        if isinstance(value, date):
+            return value.toordinal()
+        return datetime.strptime(str(value), '%Y-%m-%d').date().toordinal()
+
     def add_new_tracking_numbers(self, excel_data: Dict[str, Dict[str, Any]]) -> int:
         """
         Add new tracking numbers from Excel that don't exist in database
@@ -89,38 +220,32 @@ class DatabaseManager:
             Number of new tracking numbers added
         """
         
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        new_count = 0
-        
-        for tracking_number, data in excel_data.items():
-            # Check if tracking number already exists
-            cursor.execute(
-                'SELECT tracking_number FROM tracking_data WHERE tracking_number = ?',
-                (tracking_number,)
+        # Single batched statement: the primary key makes INSERT OR IGNORE
+        # skip existing rows, so no per-number existence SELECT is needed
+        rows = [
+            (
+                tracking_number,
+                self._to_ordinal(data.get('planned_pickup_date')),
+                data.get('destination', ''),
+                data.get('reference_number', ''),
+                data.get('shipper_info', ''),
+                'Pending API Call'
             )
-            
-            if cursor.fetchone() is None:
-                # Insert new tracking number
-                cursor.execute('''
-                    INSERT INTO tracking_data (
-                        tracking_number, planned_pickup_date, destination,
-                        reference_number, shipper_info, internal_status
-                    ) VALUES (?, ?, ?, ?, ?, ?)
-                ''', (
-                    tracking_number,
-                    data.get('planned_pickup_date'),
-                    data.get('destination', ''),
-                    data.get('reference_number', ''),
-                    data.get('shipper_info', ''),
-                    'Pending API Call'
-                ))
-                new_count += 1
-        
-        conn.commit()
-        conn.close()
-        
+            for tracking_number, data in excel_data.items()
+        ]
+
+        with self._lock:
+            cursor = self._conn.cursor()
+            cursor.executemany('''
+                INSERT OR IGNORE INTO tracking_data (
+                    tracking_number, planned_pickup_date, destination,
+                    reference_number, shipper_info, internal_status
+                ) VALUES (?, ?, ?, ?, ?, ?)
+            ''', rows)
+
+            new_count = cursor.rowcount
+            self._conn.commit()
+
         return new_count
     
     def get_active_tracking_numbers(self, max_pickup_date: date) -> List[Dict[str, Any]]:
@@ -136,112 +261,186 @@ class DatabaseManager:
             List of dictionaries with tracking data
         """
         
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            SELECT 
-                tracking_number, planned_pickup_date, destination,
-                reference_number, shipper_info, internal_status, ups_status,
-                last_updated, api_call_count
-            FROM tracking_data
-            WHERE 
-                -- Constraint 1: Not delivered
-                (internal_status IS NULL OR LOWER(internal_status) NOT LIKE '%delivered%')
-                -- Constraint 2: Pickup date is today or before
-                AND planned_pickup_date <= ?
-            ORDER BY planned_pickup_date ASC
-        ''', (max_pickup_date,))
-        
-        results = [dict(row) for row in cursor.fetchall()]
-        
-        conn.close()
-        
+        with self._lock:
+            cursor = self._conn.cursor()
+
+            cursor.execute('''
+                SELECT
+                    tracking_number, planned_pickup_date, destination,
+                    reference_number, shipper_info, internal_status, ups_status,
+                    last_updated, api_call_count
+                FROM tracking_data
+                WHERE
+                    -- Constraint 1: Not delivered
+                    (internal_status IS NULL OR LOWER(internal_status) NOT LIKE '%delivered%')
+                    -- Constraint 2: Pickup date is today or before
+                    AND planned_pickup_date <= ?
+                ORDER BY planned_pickup_date ASC
+            ''', (max_pickup_date.toordinal(),))
+
+            results = [dict(row) for row in cursor.fetchall()]
+
+        # Stored as ordinals; callers expect ISO date strings
+        for row in results:
+            row['planned_pickup_date'] = date.fromordinal(row['planned_pickup_date']).isoformat()
+
         return results
     
     def update_tracking_record(self, tracking_number: str, processed_data: Dict) -> None:
         """Update tracking record with latest information"""
         
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        # Get the planned_pickup_date to calculate days_since_pickup
-        cursor.execute(
-            'SELECT planned_pickup_date FROM tracking_data WHERE tracking_number = ?',
-            (tracking_number,)
-        )
-        result = cursor.fetchone()
-        
-        if not result:
-            logging.warning(f"Tracking number {tracking_number} not found in database")
-            conn.close()
-            return
-        
-        planned_pickup_date = datetime.strptime(result[0], '%Y-%m-%d').date()
-        today = datetime.now().date()
-        
-        # Calculate days
-        days_until_pickup = (planned_pickup_date - today).days if planned_pickup_date > today else 0
-        days_since_pickup = (today - planned_pickup_date).days if planned_pickup_date <= today else 0
-        
-        cursor.execute('''
-            UPDATE tracking_data 
-            SET ups_status = ?,
-                internal_status = ?,
-                estimated_delivery_date = ?,
-                actual_delivery_date = ?,
-                actual_delivery_time = ?,
-                days_until_pickup = ?,
-                days_since_pickup = ?,
-                last_updated = ?,
-                api_call_count = api_call_count + 1
-            WHERE tracking_number = ?
-        ''', (
-            processed_data['ups_status'],
-            processed_data['internal_status'],
-            processed_data.get('estimated_delivery_date'),
-            processed_data.get('actual_delivery_date'),
-            processed_data.get('actual_delivery_time'),
-            days_until_pickup,
-            days_since_pickup,
-            datetime.now(),
-            tracking_number
-        ))
-        
-        conn.commit()
-        conn.close()
-    
+        with self._lock:
+            cursor = self._conn.cursor()
+
+            # Day deltas are computed in SQL from the stored pickup ordinal,
+            # so no SELECT + strptime round-trip is needed before the UPDATE
+            # - pure integer subtraction against today's ordinal
+            today_ordinal = date.today().toordinal()
+            cursor.execute('''
+                UPDATE tracking_data
+                SET ups_status = ?,
+                    internal_status = ?,
+                    estimated_delivery_date = ?,
+                    actual_delivery_date = ?,
+                    actual_delivery_time = ?,
+                    days_until_pickup = MAX(0, planned_pickup_date - ?),
+                    days_since_pickup = MAX(0, ? - planned_pickup_date),
+                    last_updated = ?,
+                    api_call_count = api_call_count + 1
+                WHERE tracking_number = ?
+            ''', (
+                processed_data['ups_status'],
+                processed_data['internal_status'],
+                processed_data.get('estimated_delivery_date'),
+                processed_data.get('actual_delivery_date'),
+                processed_data.get('actual_delivery_time'),
+                today_ordinal,
+                today_ordinal,
+                datetime.now(),
+                tracking_number
+            ))
+
+            if cursor.rowcount == 0:
+                logging.warning(f"Tracking number {tracking_number} not found in database")
+                # The UPDATE still opened a write transaction - end it here
+                # rather than holding the WAL write lock until some later
+                # call happens to commit
+                self._conn.rollback()
+                return
+
+            self._conn.commit()
+
+    def update_tracking_records_bulk(self, updates: List[tuple]) -> int:
+        """
+        Update many tracking records in one transaction
+
+        Args:
+            updates: List of (tracking_number, processed_data) tuples, where
+                     processed_data matches update_tracking_record's input
+
+        Returns:
+            Number of update statements executed
+        """
+
+        now = datetime.now()
+        today_ordinal = date.today().toordinal()
+        rows = [
+            (
+                processed_data['ups_status'],
+                processed_data['internal_status'],
+                processed_data.get('estimated_delivery_date'),
+                processed_data.get('actual_delivery_date'),
+                processed_data.get('actual_delivery_time'),
+                today_ordinal,
+                today_ordinal,
+                now,
+                tracking_number
+            )
+            for tracking_number, processed_data in updates
+        ]
+
+        # One transaction for the whole batch - committing per record pays
+        # a journal sync per update, which dominates at thousands of rows
+        with self._lock:
+            cursor = self._conn.cursor()
+            cursor.executemany('''
+                UPDATE tracking_data
+                SET ups_status = ?,
+                    internal_status = ?,
+                    estimated_delivery_date = ?,
+                    actual_delivery_date = ?,
+                    actual_delivery_time = ?,
+                    days_until_pickup = MAX(0, planned_pickup_date - ?),
+                    days_since_pickup = MAX(0, ? - planned_pickup_date),
+                    last_updated = ?,
+                    api_call_count = api_call_count + 1
+                WHERE tracking_number = ?
+            ''', rows)
+            self._conn.commit()
+
+        return len(rows)
+
+    def search_shipments(self, text: str) -> List[Dict[str, Any]]:
+        """
+        Full-text search over destination, reference and status columns
+
+        Args:
+            text: FTS5 match expression (bare words, prefixes like 'amster*',
+                  or boolean combinations)
+
+        Returns:
+            List of matching tracking records
+        """
+
+        with self._lock:
+            cursor = self._conn.cursor()
+
+            if self._fts_enabled:
+                cursor.execute('''
+                    SELECT t.*
+                    FROM tracking_fts f
+                    JOIN tracking_data t ON t.rowid = f.rowid
+                    WHERE tracking_fts MATCH ?
+                ''', (text,))
+            else:
+                # Fallback for SQLite builds without FTS5
+                pattern = f'%{text}%'
+                cursor.execute('''
+                    SELECT * FROM tracking_data
+                    WHERE destination LIKE ? OR reference_number LIKE ?
+                       OR internal_status LIKE ? OR ups_status LIKE ?
+                ''', (pattern, pattern, pattern, pattern))
+
+            results = [dict(row) for row in cursor.fetchall()]
+
+        return results
+
     def get_database_stats(self) -> Dict[str, Any]:
         """Get statistics about the database for monitoring"""
         
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        # Total records
-        cursor.execute('SELECT COUNT(*) FROM tracking_data')
-        total = cursor.fetchone()[0]
-        
-        # Active (not delivered)
-        cursor.execute('''
-            SELECT COUNT(*) FROM tracking_data 
-            WHERE internal_status IS NULL OR LOWER(internal_status) NOT LIKE '%delivered%'
-        ''')
-        active = cursor.fetchone()[0]
-        
-        # Delivered
-        cursor.execute('''
-            SELECT COUNT(*) FROM tracking_data 
-            WHERE LOWER(internal_status) LIKE '%delivered%'
-        ''')
-        delivered = cursor.fetchone()[0]
-        
-        # Last update time
-        cursor.execute('SELECT MAX(last_updated) FROM tracking_data')
-        last_update = cursor.fetchone()[0]
-        
-        conn.close()
-        
+        with self._lock:
+            cursor = self._conn.cursor()
+
+            # All four aggregates in one pass over the table via
+            # conditional aggregation, instead of four separate scans
+            cursor.execute('''
+                SELECT
+                    COUNT(*),
+                    SUM(CASE WHEN internal_status IS NULL
+                             OR LOWER(internal_status) NOT LIKE '%delivered%'
+                        THEN 1 ELSE 0 END),
+                    SUM(CASE WHEN LOWER(internal_status) LIKE '%delivered%'
+                        THEN 1 ELSE 0 END),
+                    MAX(last_updated)
+                FROM tracking_data
+            ''')
+
+            total, active, delivered, last_update = cursor.fetchone()
+
+        # SUM over zero rows yields NULL
+        active = active or 0
+        delivered = delivered or 0
+
         return {
             "total_records": total,
             "active_shipments": active,
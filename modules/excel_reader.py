@@ -3,12 +3,129 @@ Excel Reader - Load tracking numbers from Excel file
 Updated to handle HaDEA Order Entry Excel format with multiple sheets and column variations
 """
 
+import numpy as np
+import openpyxl
 import pandas as pd
+import hashlib
+import itertools
 import logging
+import re
+import pickle
+import tempfile
 from datetime import datetime
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional
 import os
 
+# Prefer the Rust-based calamine engine when available - it streams the
+# XLSX instead of building openpyxl's full DOM, which dominates read time
+# on large sheets. openpyxl remains the fallback (and still handles the
+# read-only header detection either way).
+try:
+    import python_calamine  # noqa: F401
+    _EXCEL_ENGINE = 'calamine'
+except ImportError:
+    _EXCEL_ENGINE = 'openpyxl'
+
+# Union of source columns the parser consumes across all sheet layouts -
+# passed as usecols so the engine skips every other cell
+_SOURCE_COLUMNS = frozenset({
+    'WAYBILLNUMBER',
+    'Shipping Date (SD-14)',
+    'Confirmed Pick-up Date',
+    'CITY',
+    'COUNTRY',
+    'ID',
+    'ToSite-UPSName',
+    'FromSite-UPS',
+    'ToSite-HaDEAName',
+    'FromSiteName',
+    'DELIVERYADDRESS',
+    'deliveryadres',
+    'EXPECTEDDELIVERYDATE',
+    'Type',
+    'Quantity',
+})
+
+# Explicit dtypes for the text columns - skips pandas' inference pass;
+# keys for columns a sheet doesn't have are ignored
+_SOURCE_DTYPES = {
+    'WAYBILLNUMBER': 'string',
+    'CITY': 'string',
+    'COUNTRY': 'string',
+    'ID': 'string',
+    'ToSite-UPSName': 'string',
+    'FromSite-UPS': 'string',
+    'ToSite-HaDEAName': 'string',
+    'FromSiteName': 'string',
+    'DELIVERYADDRESS': 'string',
+    'deliveryadres': 'string',
+    'Type': 'string',
+    'Quantity': 'string',
+}
+
+# Shape checks for the two supported pickup-date string formats
+_ISO_DATE_RE = re.compile(r'\d{4}-\d{2}-\d{2}')
+_EU_DATE_RE = re.compile(r'\d{2}-\d{2}-\d{4}')
+
+# Sheets that contain tracking data - one case-insensitive scan per sheet
+# name instead of a lower() allocation plus a keyword loop
+_SHEET_RE = re.compile(r'outbound|sample|inbound|shipment', re.IGNORECASE)
+
+# Source column -> attribute-safe name, so itertuples rows expose every
+# field as a plain attribute
+_RENAME_MAP = {
+    'ToSite-UPSName': 'ToSite_UPSName',
+    'FromSite-UPS': 'FromSite_UPS',
+    'ToSite-HaDEAName': 'ToSite_HaDEAName',
+}
+
+# Every column the row loop reads; sheets missing some of these get them
+# filled with NaN by reindex so attribute access never fails
+_EXPECTED_COLUMNS = [
+    'WAYBILLNUMBER',
+    'pickup_date',
+    'CITY',
+    'COUNTRY',
+    'ID',
+    'ToSite_UPSName',
+    'FromSite_UPS',
+    'ToSite_HaDEAName',
+    'FromSiteName',
+    'DELIVERYADDRESS',
+    'deliveryadres',
+    'EXPECTEDDELIVERYDATE',
+    'Type',
+    'Quantity',
+]
+
+# Source/derived column -> published field name on the returned frame
+_OUTPUT_RENAME = {
+    'pickup_date': 'planned_pickup_date',
+    'ID': 'reference_number',
+    'CITY': 'city',
+    'COUNTRY': 'country',
+    'EXPECTEDDELIVERYDATE': 'expected_delivery',
+    'Type': 'type',
+    'Quantity': 'quantity',
+}
+
+# Column order of the published frame (tracking_number becomes the index)
+_FRAME_COLUMNS = [
+    'tracking_number',
+    'planned_pickup_date',
+    'destination',
+    'reference_number',
+    'shipper_info',
+    'sheet_name',
+    'city',
+    'country',
+    'delivery_address',
+    'expected_delivery',
+    'site_name',
+    'type',
+    'quantity',
+]
+
 class ExcelReader:
     def __init__(self, excel_path: str = None):
         """
@@ -18,90 +135,215 @@ class ExcelReader:
             excel_path: Path to Excel file (can be set via environment variable)
         """
         self.excel_path = excel_path or os.getenv('EXCEL_FILE_PATH')
-        
+
         if not self.excel_path:
             raise ValueError("Excel file path not configured. Set EXCEL_FILE_PATH environment variable")
+
+        # Read-only workbook shared across _read_sheet calls within one
+        # load, for streaming header detection
+        self._wb = None
     
-    def load_tracking_numbers(self) -> Dict[str, Dict[str, Any]]:
+    def load_tracking_frame(self) -> pd.DataFrame:
         """
-        Load tracking numbers from all relevant sheets in HaDEA Order Entry Excel file
-        
+        Load tracking data from all relevant sheets as one DataFrame
+
+        The frame is indexed by tracking number with one column per field -
+        a struct-of-arrays layout, so the whole load is a handful of column
+        arrays instead of one dict object per shipment, and callers can
+        diff against existing keys with index operations
+        (df.index.difference(...)) without materializing per-row dicts.
+
         Returns:
-            Dictionary with tracking_number as key and row data as value
+            DataFrame indexed by tracking_number, one row per shipment
         """
-        
+
         logging.info(f"Reading Excel file: {self.excel_path}")
-        
+
+        # Check the on-disk cache first - the workbook rarely changes between
+        # hourly runs, so most invocations can skip openpyxl entirely
+        use_cache = os.getenv('EXCEL_NO_CACHE') != '1'
+        cache_path = None
+
+        if use_cache:
+            file_hash = self._file_hash()
+            cache_path = os.path.join(tempfile.gettempdir(), f"excel_frame_{file_hash}.pkl")
+            cached = self._load_cache(cache_path)
+
+            if cached is not None:
+                logging.info(f"✅ Cache hit: {len(cached)} tracking numbers (skipped Excel parsing)")
+                return cached
+
         try:
             # Load Excel file to check sheets
-            excel_file = pd.ExcelFile(self.excel_path, engine='openpyxl')
-            
+            excel_file = pd.ExcelFile(self.excel_path, engine=_EXCEL_ENGINE)
+
             logging.info(f"✓ Found sheets: {excel_file.sheet_names}")
-            
+
             # Define which sheets to read
-            sheets_to_read = []
-            for sheet_name in excel_file.sheet_names:
-                sheet_lower = sheet_name.lower()
-                # Read sheets that contain tracking data
-                if any(keyword in sheet_lower for keyword in ['outbound', 'sample', 'inbound', 'shipment']):
-                    sheets_to_read.append(sheet_name)
-            
+            sheets_to_read = [
+                sheet_name for sheet_name in excel_file.sheet_names
+                if _SHEET_RE.search(sheet_name)
+            ]
+
             if not sheets_to_read:
                 logging.warning("No specific sheets found, reading all sheets")
                 sheets_to_read = excel_file.sheet_names
-            
+
             logging.info(f"📊 Reading sheets: {sheets_to_read}")
-            
+
             # Combine tracking data from all sheets
-            all_tracking_data = {}
-            
-            for sheet_name in sheets_to_read:
-                logging.info(f"Processing sheet: {sheet_name}")
-                sheet_data = self._read_sheet(sheet_name)
-                
-                # Merge with existing data
-                all_tracking_data.update(sheet_data)
-                logging.info(f"  ✓ Added {len(sheet_data)} tracking numbers from '{sheet_name}'")
-            
-            logging.info(f"✅ Total: {len(all_tracking_data)} tracking numbers from {len(sheets_to_read)} sheet(s)")
-            
-            return all_tracking_data
-            
+            frames = []
+
+            # One read-only workbook for header detection across all sheets
+            self._wb = openpyxl.load_workbook(self.excel_path, read_only=True, data_only=True)
+            try:
+                for sheet_name in sheets_to_read:
+                    logging.info(f"Processing sheet: {sheet_name}")
+                    sheet_frame = self._read_sheet_frame(sheet_name)
+
+                    if not sheet_frame.empty:
+                        frames.append(sheet_frame)
+                    logging.info(f"  ✓ Added {len(sheet_frame)} tracking numbers from '{sheet_name}'")
+            finally:
+                self._wb.close()
+                self._wb = None
+
+            if frames:
+                combined = pd.concat(frames, ignore_index=True)
+            else:
+                combined = pd.DataFrame(columns=_FRAME_COLUMNS)
+
+            # Later sheets/rows win on duplicate waybills - same semantics
+            # as the dict.update merge this replaces
+            combined = combined.drop_duplicates('tracking_number', keep='last')
+            combined = combined.set_index('tracking_number')
+
+            logging.info(f"✅ Total: {len(combined)} tracking numbers from {len(sheets_to_read)} sheet(s)")
+
+            if cache_path:
+                self._save_cache(cache_path, combined)
+
+            return combined
+
         except Exception as e:
             logging.error(f"✗ Error reading Excel file: {str(e)}")
             raise
+
+    def load_tracking_numbers(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Load tracking numbers from all relevant sheets in HaDEA Order Entry Excel file
+
+        Legacy dict-of-dicts view over load_tracking_frame, for callers
+        that want per-shipment dict lookups.
+
+        Returns:
+            Dictionary with tracking_number as key and row data as value
+        """
+
+        frame = self.load_tracking_frame()
+
+        # One C-level conversion instead of a per-row Python dict literal;
+        # the index is copied back in as a column first so each value keeps
+        # its tracking_number key, as the old per-row build did
+        return frame.assign(tracking_number=frame.index).to_dict(orient='index')
+
+    def _file_hash(self) -> str:
+        """Compute SHA-256 of the workbook bytes - used as the cache key"""
+        with open(self.excel_path, 'rb') as f:
+            return hashlib.sha256(f.read()).hexdigest()
+
+    def _load_cache(self, cache_path: str) -> Optional[pd.DataFrame]:
+        """Load previously parsed tracking data, or None on miss/corruption"""
+        if not os.path.exists(cache_path):
+            return None
+
+        try:
+            with open(cache_path, 'rb') as f:
+                return pickle.load(f)
+        except Exception as e:
+            logging.warning(f"Could not read Excel cache {cache_path}: {str(e)}")
+            return None
+
+    def _save_cache(self, cache_path: str, tracking_data: pd.DataFrame) -> None:
+        """Persist parsed tracking data for the next warm invocation"""
+        try:
+            with open(cache_path, 'wb') as f:
+                pickle.dump(tracking_data, f)
+        except Exception as e:
+            logging.warning(f"Could not write Excel cache {cache_path}: {str(e)}")
     
-    def _read_sheet(self, sheet_name: str) -> Dict[str, Dict[str, Any]]:
+    def _detect_header_row(self, sheet_name: str) -> Optional[int]:
+        """
+        Find the 0-based row holding the WAYBILLNUMBER header
+
+        Streams just the first few rows of the sheet through openpyxl's
+        read-only mode - no full sheet parse per candidate row.
+        """
+        wb = self._wb
+        own_wb = wb is None
+        if own_wb:
+            wb = openpyxl.load_workbook(self.excel_path, read_only=True, data_only=True)
+
+        try:
+            ws = wb[sheet_name]
+            for i, values in enumerate(itertools.islice(ws.iter_rows(values_only=True), 4)):
+                if 'WAYBILLNUMBER' in values:
+                    return i
+            return None
+        finally:
+            if own_wb:
+                wb.close()
+
+    @staticmethod
+    def _detect_date_format(series: "pd.Series") -> Optional[str]:
+        """
+        Detect a date column's string format from its first non-null value
+
+        Sheets are single-format in practice, so one cheap regex check
+        picks the strptime format for the whole column.
+        """
+        sample = series.dropna()
+        if sample.empty:
+            return None
+
+        first = str(sample.iloc[0])
+        if _ISO_DATE_RE.fullmatch(first):
+            return '%Y-%m-%d'
+        if _EU_DATE_RE.fullmatch(first):
+            return '%d-%m-%Y'
+        return None
+
+    def _read_sheet_frame(self, sheet_name: str) -> pd.DataFrame:
         """
         Read tracking numbers from a single sheet
-        
+
         Args:
             sheet_name: Name of the sheet to read
-            
+
         Returns:
-            Dictionary with tracking numbers from this sheet
+            DataFrame with one row per tracking number from this sheet
         """
-        
+
         try:
-            # Try different header rows
-            for header_row in [3, 2, 1, 0]:
-                try:
-                    df = pd.read_excel(
-                        self.excel_path, 
-                        sheet_name=sheet_name,
-                        engine='openpyxl',
-                        header=header_row
-                    )
-                    
-                    # Check if this row contains WAYBILLNUMBER
-                    if 'WAYBILLNUMBER' in df.columns:
-                        logging.info(f"  Found headers at row {header_row} in sheet '{sheet_name}'")
-                        break
-                except:
-                    continue
-            else:
+            # Locate the header row by streaming the first few rows of the
+            # sheet, then parse it exactly once - instead of re-reading the
+            # whole sheet per candidate header row
+            header_row = self._detect_header_row(sheet_name)
+
+            if header_row is None:
                 logging.warning(f"  Could not find WAYBILLNUMBER column in sheet '{sheet_name}', skipping")
-                return {}
+                return pd.DataFrame(columns=_FRAME_COLUMNS)
+
+            logging.info(f"  Found headers at row {header_row} in sheet '{sheet_name}'")
+
+            df = pd.read_excel(
+                self.excel_path,
+                sheet_name=sheet_name,
+                engine=_EXCEL_ENGINE,
+                header=header_row,
+                usecols=lambda c: c in _SOURCE_COLUMNS,
+                dtype=_SOURCE_DTYPES
+            )
             
             # Identify which pickup date column to use
             pickup_date_column = None
@@ -111,89 +353,99 @@ class ExcelReader:
                 pickup_date_column = 'Confirmed Pick-up Date'
             else:
                 logging.warning(f"  No pickup date column found in sheet '{sheet_name}', skipping")
-                return {}
+                return pd.DataFrame(columns=_FRAME_COLUMNS)
             
             logging.info(f"  Using pickup date column: '{pickup_date_column}'")
-            
-            # Convert to dictionary
-            tracking_data = {}
-            
-            for _, row in df.iterrows():
-                # Get tracking numbers (can be multiple, separated by semicolons)
-                waybill_str = str(row['WAYBILLNUMBER']).strip()
-                
-                # Skip empty rows
-                if not waybill_str or waybill_str.lower() == 'nan':
-                    continue
-                
-                # Split multiple tracking numbers
-                tracking_numbers = [tn.strip() for tn in waybill_str.split(';') if tn.strip()]
-                
-                # Parse pickup date
-                pickup_date = row[pickup_date_column]
-                
-                # Handle different date formats
-                if pd.isna(pickup_date):
-                    continue
-                elif isinstance(pickup_date, str):
-                    try:
-                        pickup_date = datetime.strptime(pickup_date, '%Y-%m-%d').date()
-                    except ValueError:
-                        try:
-                            pickup_date = datetime.strptime(pickup_date, '%d-%m-%Y').date()
-                        except ValueError:
-                            continue
-                elif hasattr(pickup_date, 'date'):
-                    pickup_date = pickup_date.date()
+
+            # Normalize column names to valid identifiers and make every
+            # expected column present, so the itertuples rows (plain
+            # namedtuples, no per-row Series construction) can be read by
+            # attribute everywhere below
+            df = df.rename(columns={**_RENAME_MAP, pickup_date_column: 'pickup_date'})
+            df = df.reindex(columns=_EXPECTED_COLUMNS)
+
+            # Parse the whole pickup-date column vectorized instead of a
+            # per-row strptime try/except ladder, and drop the rows without
+            # a usable date up front. The column's format is detected once
+            # from the first non-null value (a sheet is single-format in
+            # practice), so the common case is exactly one to_datetime pass
+            # with no coerce-and-retry churn
+            raw_dates = df['pickup_date']
+            if pd.api.types.is_datetime64_any_dtype(raw_dates):
+                parsed = raw_dates
+            else:
+                detected = self._detect_date_format(raw_dates)
+
+                if detected:
+                    parsed = pd.to_datetime(raw_dates, format=detected, errors='coerce')
+                    # Stragglers in the other supported format
+                    retry = parsed.isna() & raw_dates.notna()
+                    if retry.any():
+                        other = '%d-%m-%Y' if detected == '%Y-%m-%d' else '%Y-%m-%d'
+                        parsed.loc[retry] = pd.to_datetime(
+                            raw_dates[retry], format=other, errors='coerce'
+                        )
                 else:
-                    continue
-                
-                # Build destination from CITY + COUNTRY
-                city = str(row.get('CITY', '')).strip() if pd.notna(row.get('CITY')) else ''
-                country = str(row.get('COUNTRY', '')).strip() if pd.notna(row.get('COUNTRY')) else ''
-                destination = f"{city}, {country}" if city and country else (city or country or '')
-                
-                # Get other fields (column names vary by sheet)
-                reference_number = str(row.get('ID', '')).strip() if pd.notna(row.get('ID')) else ''
-                
-                # Shipper info - different columns in different sheets
-                shipper_info = ''
-                if pd.notna(row.get('ToSite-UPSName')):
-                    shipper_info = str(row.get('ToSite-UPSName', '')).strip()
-                elif pd.notna(row.get('FromSite-UPS')):
-                    shipper_info = str(row.get('FromSite-UPS', '')).strip()
-                
-                # Site name - different columns
-                site_name = ''
-                if pd.notna(row.get('ToSite-HaDEAName')):
-                    site_name = str(row.get('ToSite-HaDEAName', '')).strip()
-                elif pd.notna(row.get('FromSiteName')):
-                    site_name = str(row.get('FromSiteName', '')).strip()
-                
-                # Add each tracking number with the same row data
-                for tracking_number in tracking_numbers:
-                    if len(tracking_number) < 10:  # Skip invalid tracking numbers
-                        continue
-                    
-                    tracking_data[tracking_number] = {
-                        'tracking_number': tracking_number,
-                        'planned_pickup_date': pickup_date,
-                        'destination': destination,
-                        'reference_number': reference_number,
-                        'shipper_info': shipper_info,
-                        'sheet_name': sheet_name,
-                        # Store additional fields
-                        'city': city,
-                        'country': country,
-                        'delivery_address': str(row.get('DELIVERYADDRESS', row.get('deliveryadres', ''))).strip() if pd.notna(row.get('DELIVERYADDRESS', row.get('deliveryadres', ''))) else '',
-                        'expected_delivery': row.get('EXPECTEDDELIVERYDATE'),
-                        'site_name': site_name,
-                        'type': str(row.get('Type', '')).strip() if pd.notna(row.get('Type')) else '',
-                        'quantity': str(row.get('Quantity', '')).strip() if pd.notna(row.get('Quantity')) else ''
-                    }
-            
-            return tracking_data
-            
+                    parsed = pd.to_datetime(raw_dates, errors='coerce', dayfirst=True)
+
+                # Flexible pass for Excel-native datetime cells sitting in
+                # an object column
+                retry = parsed.isna() & raw_dates.notna()
+                if retry.any():
+                    parsed.loc[retry] = pd.to_datetime(
+                        raw_dates[retry], errors='coerce', dayfirst=True
+                    )
+
+            df['pickup_date'] = parsed
+            df = df.dropna(subset=['pickup_date'])
+            df['pickup_date'] = df['pickup_date'].dt.date
+
+            # Clean the string columns once, column-wise, and precompute
+            # the derived fields the loop used to rebuild per row - a
+            # handful of C-level passes instead of N pd.notna/str/strip
+            # call chains
+            def _clean(column: str) -> pd.Series:
+                return df[column].astype('string').str.strip().fillna('')
+
+            city = _clean('CITY')
+            country = _clean('COUNTRY')
+            df['CITY'] = city
+            df['COUNTRY'] = country
+            df['destination'] = np.where(
+                (city != '') & (country != ''),
+                city + ', ' + country,
+                np.where(city != '', city, country)
+            )
+            df['ID'] = _clean('ID')
+            df['Type'] = _clean('Type')
+            df['Quantity'] = _clean('Quantity')
+
+            # Paired columns: prefer the first, fall back to the second
+            # (combine_first only fills actual NaNs, like the old
+            # notna-guarded if/elif did)
+            df['shipper_info'] = df['ToSite_UPSName'].combine_first(df['FromSite_UPS'])
+            df['site_name'] = df['ToSite_HaDEAName'].combine_first(df['FromSiteName'])
+            df['delivery_address'] = df['DELIVERYADDRESS'].combine_first(df['deliveryadres'])
+            for column in ('shipper_info', 'site_name', 'delivery_address'):
+                df[column] = _clean(column)
+
+            # One row per tracking number: split the semicolon-packed
+            # waybill column and explode it, then mask out the too-short
+            # (invalid) numbers - no inner split/filter loop per row, and
+            # duplicates still resolve via the dict assignment below
+            df = df.assign(
+                tracking_number=df['WAYBILLNUMBER'].astype('string').str.strip().str.split(';')
+            ).explode('tracking_number')
+            df['tracking_number'] = df['tracking_number'].astype('string').str.strip().fillna('')
+            df = df[df['tracking_number'].str.len() >= 10]
+
+            # Publish the fields under their output names - no per-row dict
+            # assembly, just a column select/rename on the arrays built above
+            df = df.rename(columns=_OUTPUT_RENAME)
+            df['sheet_name'] = sheet_name
+
+            return df[_FRAME_COLUMNS]
+
         except Exception as e:
             logging.warning(f"  Error reading sheet '{sheet_name}': {str(e)}")
-            return {}
+            return pd.DataFrame(columns=_FRAME_COLUMNS)
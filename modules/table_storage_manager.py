@@ -2,20 +2,32 @@
 Azure Table Storage Manager - Replaces SQLite for persistent storage
 """
 
-from azure.data.tables import TableServiceClient, TableEntity
+from azure.data.tables import TableServiceClient, TableEntity, UpdateMode
+from azure.data.tables.aio import TableServiceClient as AsyncTableServiceClient
 from datetime import datetime, date
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
+import asyncio
 import logging
 import os
+import threading
+import time
+
+# Short-lived cache for point lookups - agents and the UI poll the same
+# tracking number repeatedly between hourly refreshes
+_ENTITY_CACHE: Dict[str, Tuple[float, Dict[str, Any]]] = {}
+_ENTITY_CACHE_LOCK = threading.Lock()
+_ENTITY_CACHE_TTL = 60  # seconds
+_ENTITY_CACHE_MAX = 10_000
 
 class TableStorageManager:
     def __init__(self):
         """Initialize Azure Table Storage connection"""
         connection_string = os.getenv('AZURE_STORAGE_CONNECTION_STRING')
-        
+
         if not connection_string:
             raise ValueError("AZURE_STORAGE_CONNECTION_STRING not configured")
-        
+
+        self.connection_string = connection_string
         self.table_service = TableServiceClient.from_connection_string(connection_string)
         self.table_name = "TrackingData"
         
@@ -24,101 +36,665 @@ class TableStorageManager:
             self.table_client = self.table_service.create_table_if_not_exists(self.table_name)
         except Exception:
             self.table_client = self.table_service.get_table_client(self.table_name)
-        
+
+        # Secondary index holding only not-yet-delivered shipments, keyed by
+        # pickup date, so the hourly poll doesn't scan delivered history
+        self.active_table_name = "ActiveTracking"
+        try:
+            self.active_table_client = self.table_service.create_table_if_not_exists(self.active_table_name)
+        except Exception:
+            self.active_table_client = self.table_service.get_table_client(self.active_table_name)
+
+        # Secondary index keyed by internal status, so a status-only query
+        # becomes a single-partition scan instead of a full table scan
+        self.status_table_name = "StatusIndex"
+        try:
+            self.status_table_client = self.table_service.create_table_if_not_exists(self.status_table_name)
+        except Exception:
+            self.status_table_client = self.table_service.get_table_client(self.status_table_name)
+
         logging.info("✓ Table Storage initialized")
     
-    def add_new_tracking_numbers(self, excel_data: Dict[str, Dict[str, Any]]) -> int:
-        """Add new tracking numbers that don't exist in storage"""
+    @staticmethod
+    def _build_new_entity(tracking_number: str, data: Dict[str, Any]) -> Dict[str, Any]:
+        """Build the entity for a tracking number seen for the first time"""
+        return {
+            'PartitionKey': 'tracking',
+            'RowKey': tracking_number,
+            'tracking_number': tracking_number,
+            'planned_pickup_date': data.get('planned_pickup_date').isoformat() if data.get('planned_pickup_date') else None,
+            'destination': data.get('destination', ''),
+            'reference_number': data.get('reference_number', ''),
+            'shipper_info': data.get('shipper_info', ''),
+            'internal_status': 'Pending API Call',
+            'created_at': datetime.now().isoformat()
+        }
+
+    def add_new_tracking_numbers(self, excel_data) -> int:
+        """
+        Add new tracking numbers that don't exist in storage
+
+        Accepts the tracking-number-indexed DataFrame from
+        ExcelReader.load_tracking_frame (preferred - the diff against the
+        existing row keys is one index operation, and per-row dicts are
+        built only for the new slice) or the legacy dict-of-dicts shape.
+        """
+
+        # One projected query for the existing row keys instead of an
+        # exception-driven get_entity round-trip per tracking number
+        existing = {
+            e['RowKey']
+            for e in self.table_client.query_entities(
+                "PartitionKey eq 'tracking'",
+                select=['RowKey']
+            )
+        }
+
+        if hasattr(excel_data, 'index'):
+            new_index = excel_data.index.difference(list(existing))
+            new_records = excel_data.loc[new_index].to_dict(orient='index')
+        else:
+            new_records = {tn: excel_data[tn] for tn in excel_data if tn not in existing}
+
+        new_keys = list(new_records)
         new_count = 0
-        
-        for tracking_number, data in excel_data.items():
+
+        # Insert in transaction batches of 100 (the Table Storage maximum)
+        for i in range(0, len(new_keys), 100):
+            chunk = new_keys[i:i + 100]
+            entities = [self._build_new_entity(tn, new_records[tn]) for tn in chunk]
+
             try:
-                # Check if exists
-                existing = self.table_client.get_entity(
-                    partition_key="tracking",
-                    row_key=tracking_number
+                self.table_client.submit_transaction([('create', entity) for entity in entities])
+            except Exception as e:
+                logging.error("Failed to insert batch of %d new tracking numbers: %s", len(entities), e)
+                continue
+
+            for entity in entities:
+                self._update_active_index(entity['RowKey'], entity)
+                self._update_status_index(entity['RowKey'], entity)
+            new_count += len(entities)
+
+        return new_count
+
+    async def add_new_tracking_numbers_async(self, excel_data) -> int:
+        """
+        Async variant of add_new_tracking_numbers
+
+        The existence scan and the insert batches go through the async
+        client, so the batch round-trips overlap instead of running back
+        to back; the secondary-index writes ride asyncio.to_thread off the
+        event loop. Same inputs and return value as the sync version.
+        """
+        async with AsyncTableServiceClient.from_connection_string(self.connection_string) as service:
+            table_client = service.get_table_client(self.table_name)
+
+            existing = {
+                e['RowKey']
+                async for e in table_client.query_entities(
+                    "PartitionKey eq 'tracking'",
+                    select=['RowKey']
                 )
-            except:
-                # Doesn't exist, create it
-                entity = {
-                    'PartitionKey': 'tracking',
+            }
+
+            if hasattr(excel_data, 'index'):
+                new_index = excel_data.index.difference(list(existing))
+                new_records = excel_data.loc[new_index].to_dict(orient='index')
+            else:
+                new_records = {tn: excel_data[tn] for tn in excel_data if tn not in existing}
+
+            new_keys = list(new_records)
+            semaphore = asyncio.Semaphore(8)
+
+            async def insert_batch(chunk: List[str]) -> int:
+                entities = [self._build_new_entity(tn, new_records[tn]) for tn in chunk]
+
+                async with semaphore:
+                    try:
+                        await table_client.submit_transaction([('create', entity) for entity in entities])
+                    except Exception as e:
+                        logging.error("Failed to insert batch of %d new tracking numbers: %s", len(entities), e)
+                        return 0
+
+                    for entity in entities:
+                        await asyncio.to_thread(self._update_active_index, entity['RowKey'], entity)
+                        await asyncio.to_thread(self._update_status_index, entity['RowKey'], entity)
+
+                return len(entities)
+
+            batches = [new_keys[i:i + 100] for i in range(0, len(new_keys), 100)]
+            return sum(await asyncio.gather(*(insert_batch(batch) for batch in batches)))
+
+    def _update_active_index(self, tracking_number: str, entity: Dict[str, Any]) -> None:
+        """
+        Keep the ActiveTracking index in sync after a write
+
+        Delivered shipments are removed from the index; everything else is
+        upserted with PartitionKey = planned pickup date so the hourly poll
+        can range-scan by date.
+        """
+        try:
+            status = (entity.get('internal_status') or '').lower()
+            pickup_key = entity.get('planned_pickup_date') or '9999-12-31'
+
+            if 'delivered' in status:
+                if entity.get('planned_pickup_date'):
+                    keys = [pickup_key]
+                else:
+                    # Partial (merge) update without the pickup date: look
+                    # the index row up by RowKey instead of deleting under a
+                    # guessed key, or the shipment would stay in the hourly
+                    # poll forever
+                    escaped = tracking_number.replace("'", "''")
+                    keys = [
+                        row['PartitionKey']
+                        for row in self.active_table_client.query_entities(
+                            f"RowKey eq '{escaped}'",
+                            select=['PartitionKey']
+                        )
+                    ]
+
+                for key in keys:
+                    try:
+                        self.active_table_client.delete_entity(
+                            partition_key=key,
+                            row_key=tracking_number
+                        )
+                    except Exception:
+                        pass  # already removed
+            else:
+                # Only carry the fields the source entity actually has -
+                # partial (merge) updates must not blank index columns,
+                # and upsert_entity merges by default
+                index_entity = {
+                    'PartitionKey': pickup_key,
                     'RowKey': tracking_number,
-                    'tracking_number': tracking_number,
-                    'planned_pickup_date': data.get('planned_pickup_date').isoformat() if data.get('planned_pickup_date') else None,
-                    'destination': data.get('destination', ''),
-                    'reference_number': data.get('reference_number', ''),
-                    'shipper_info': data.get('shipper_info', ''),
-                    'internal_status': 'Pending API Call',
-                    'created_at': datetime.now().isoformat()
+                    'tracking_number': tracking_number
                 }
-                
-                self.table_client.create_entity(entity)
-                new_count += 1
-        
-        return new_count
-    
+                for field in ('planned_pickup_date', 'destination',
+                              'reference_number', 'shipper_info',
+                              'internal_status', 'api_call_count'):
+                    value = entity.get(field)
+                    if value is not None:
+                        index_entity[field] = value
+
+                self.active_table_client.upsert_entity(index_entity)
+
+        except Exception as e:
+            logging.warning("Could not update active index for %s: %s", tracking_number, e)
+
+    def _update_status_index(
+        self,
+        tracking_number: str,
+        entity: Dict[str, Any],
+        previous_status: Optional[str] = None
+    ) -> None:
+        """
+        Keep the StatusIndex in sync after a write
+
+        Each shipment lives in the partition named after its internal
+        status; a status change moves it by deleting the row from the old
+        partition and upserting it into the new one. The index carries the
+        columns the agent query reads, so bucket queries don't need to
+        touch the main table.
+        """
+        try:
+            status = entity.get('internal_status') or 'Unknown Status'
+
+            if previous_status and previous_status != status:
+                try:
+                    self.status_table_client.delete_entity(
+                        partition_key=previous_status,
+                        row_key=tracking_number
+                    )
+                except Exception:
+                    pass  # not indexed yet
+
+            # As with the active index: carry only the fields present on
+            # the source entity, so partial (merge) updates don't blank
+            # index columns
+            index_entity: Dict[str, Any] = {
+                'PartitionKey': status,
+                'RowKey': tracking_number,
+                'tracking_number': tracking_number,
+                'internal_status': status
+            }
+            for field in ('planned_pickup_date', 'destination',
+                          'reference_number', 'shipper_info', 'ups_status',
+                          'estimated_delivery_date', 'actual_delivery_date',
+                          'actual_delivery_time', 'days_until_pickup',
+                          'days_since_pickup', 'last_updated'):
+                value = entity.get(field)
+                if value is not None:
+                    index_entity[field] = value
+
+            self.status_table_client.upsert_entity(index_entity)
+
+        except Exception as e:
+            logging.warning("Could not update status index for %s: %s", tracking_number, e)
+
+    def query_status_bucket(self, status: str):
+        """
+        Iterate all shipments in one status partition of the StatusIndex
+
+        Single-partition scan - the service only reads the rows for that
+        status instead of the whole tracking table.
+        """
+        escaped = status.replace("'", "''")
+        results = [
+            dict(e) for e in self.status_table_client.query_entities(
+                f"PartitionKey eq '{escaped}'"
+            )
+        ]
+
+        if results:
+            return results
+
+        # A populated index with nothing in this bucket is a real empty
+        # result - only an entirely empty index means it hasn't been built
+        probe = self.status_table_client.list_entities(results_per_page=1)
+        if next(iter(probe), None) is not None:
+            return results
+
+        # Index not populated yet (pre-existing deployment): fall back to a
+        # filtered main-table scan once and backfill the bucket as we go -
+        # delivered shipments never pass through the hourly update, so
+        # without this they would stay invisible to bucket queries forever
+        logging.info("Status index empty - scanning main table and backfilling")
+
+        for entity in self.table_client.query_entities(
+            f"PartitionKey eq 'tracking' and internal_status eq '{escaped}'"
+        ):
+            record = dict(entity)
+            results.append(record)
+            self._update_status_index(entity['RowKey'], record)
+
+        return results
+
+    def get_entity_cached(self, tracking_number: str) -> Dict[str, Any]:
+        """
+        Point lookup with a short TTL cache in front of Table Storage
+
+        Cache hits skip the storage round-trip entirely; entries expire
+        after _ENTITY_CACHE_TTL seconds and are invalidated on update.
+        """
+        now = time.time()
+
+        with _ENTITY_CACHE_LOCK:
+            hit = _ENTITY_CACHE.get(tracking_number)
+            if hit and now - hit[0] < _ENTITY_CACHE_TTL:
+                return hit[1]
+
+        entity = dict(self.table_client.get_entity(
+            partition_key="tracking",
+            row_key=tracking_number
+        ))
+
+        with _ENTITY_CACHE_LOCK:
+            if len(_ENTITY_CACHE) >= _ENTITY_CACHE_MAX:
+                _ENTITY_CACHE.clear()
+            _ENTITY_CACHE[tracking_number] = (now, entity)
+
+        return entity
+
+    @staticmethod
+    def _invalidate_cached_entity(tracking_number: str) -> None:
+        """Drop a tracking number from the point-lookup cache after a write"""
+        with _ENTITY_CACHE_LOCK:
+            _ENTITY_CACHE.pop(tracking_number, None)
+
     def get_active_tracking_numbers(self, max_pickup_date: date) -> List[Dict[str, Any]]:
-        """Get tracking numbers that need updates"""
+        """Get tracking numbers that need updates (served by the active index)"""
+        query_filter = f"PartitionKey le '{max_pickup_date.isoformat()}'"
+
+        results = [dict(e) for e in self.active_table_client.query_entities(query_filter)]
+
+        if results:
+            return results
+
+        # Index not populated yet (pre-existing deployment): fall back to the
+        # legacy full scan once and backfill the index as we go
+        logging.info("Active index empty - scanning main table and backfilling")
+
         query_filter = f"PartitionKey eq 'tracking' and planned_pickup_date le '{max_pickup_date.isoformat()}'"
-        
-        entities = self.table_client.query_entities(query_filter)
-        
-        results = []
-        for entity in entities:
+
+        for entity in self.table_client.query_entities(query_filter):
             # Skip delivered items
             status = entity.get('internal_status', '').lower()
             if 'delivered' not in status:
-                results.append(dict(entity))
-        
+                record = dict(entity)
+                results.append(record)
+                self._update_active_index(entity['RowKey'], record)
+
         return results
-    
-    def update_tracking_record(self, tracking_number: str, processed_data: Dict) -> None:
-        """Update tracking record with latest information"""
+
+    async def get_active_tracking_numbers_async(self, max_pickup_date: date) -> List[Dict[str, Any]]:
+        """
+        Async variant of get_active_tracking_numbers
+
+        Pages stream through the async client, so the scan shares the event
+        loop with whatever else the function is doing instead of blocking
+        it for the whole round-trip sequence.
+        """
+        async with AsyncTableServiceClient.from_connection_string(self.connection_string) as service:
+            active_client = service.get_table_client(self.active_table_name)
+
+            query_filter = f"PartitionKey le '{max_pickup_date.isoformat()}'"
+            results = [dict(e) async for e in active_client.query_entities(query_filter)]
+
+            if results:
+                return results
+
+            # Index not populated yet (pre-existing deployment): fall back to
+            # the legacy full scan once and backfill the index as we go
+            logging.info("Active index empty - scanning main table and backfilling")
+
+            table_client = service.get_table_client(self.table_name)
+            query_filter = f"PartitionKey eq 'tracking' and planned_pickup_date le '{max_pickup_date.isoformat()}'"
+
+            async for entity in table_client.query_entities(query_filter):
+                # Skip delivered items
+                status = entity.get('internal_status', '').lower()
+                if 'delivered' not in status:
+                    record = dict(entity)
+                    results.append(record)
+                    await asyncio.to_thread(self._update_active_index, entity['RowKey'], record)
+
+        return results
+
+    def query_tracking_records(
+        self,
+        filter_str: str,
+        select: Optional[List[str]] = None,
+        results_per_page: Optional[int] = None
+    ):
+        """
+        Query the tracking table with a server-side OData filter
+
+        Pass `select` to project only the needed columns - the service then
+        returns just those properties instead of full entities. The result
+        is a lazy iterator; callers that stop early also stop page fetches.
+        """
+        return self.table_client.query_entities(
+            filter_str,
+            select=select,
+            results_per_page=results_per_page
+        )
+
+    def iter_tracking_records(
+        self,
+        filter_str: str,
+        select: Optional[List[str]] = None,
+        results_per_page: int = 100
+    ):
+        """
+        Yield matching entities one at a time, fetching pages lazily
+
+        Generator form of query_tracking_records: abandoning the iterator
+        (e.g. breaking at a result limit) abandons the underlying pager,
+        so no further pages are requested from the service.
+        """
+        for page in self.table_client.query_entities(
+            filter_str,
+            select=select,
+            results_per_page=results_per_page
+        ).by_page():
+            yield from page
+
+    @staticmethod
+    def _records_to_columns(records: List[Dict[str, Any]]) -> Dict[str, List[Any]]:
+        """Pivot a list of record dicts into a dict of column lists"""
+        columns: Dict[str, List[Any]] = {
+            'tracking_number': [],
+            'planned_pickup_date': [],
+            'destination': [],
+            'reference_number': [],
+            'shipper_info': [],
+            'internal_status': []
+        }
+
+        for record in records:
+            for key, column in columns.items():
+                column.append(record.get(key))
+
+        return columns
+
+    def get_active_tracking_numbers_columnar(self, max_pickup_date: date) -> Dict[str, List[Any]]:
+        """
+        Columnar (struct-of-arrays) view of the active shipments
+
+        Returns a dict of column name -> list of values, one list per field
+        instead of one dict per record. Callers that only need a single
+        column - like the UPS fan-out, which just wants the tracking
+        numbers - can take it directly without per-row dict lookups.
+        """
+        return self._records_to_columns(self.get_active_tracking_numbers(max_pickup_date))
+
+    async def get_active_tracking_numbers_columnar_async(self, max_pickup_date: date) -> Dict[str, List[Any]]:
+        """Async variant of get_active_tracking_numbers_columnar"""
+        records = await self.get_active_tracking_numbers_async(max_pickup_date)
+        return self._records_to_columns(records)
+
+    @staticmethod
+    def _apply_update(entity: Dict[str, Any], processed_data: Dict) -> None:
+        """Apply processed tracking data onto an existing entity in place"""
+        entity['ups_status'] = processed_data['ups_status']
+        entity['internal_status'] = processed_data['internal_status']
+        entity['estimated_delivery_date'] = processed_data.get('estimated_delivery_date')
+        entity['actual_delivery_date'] = processed_data.get('actual_delivery_date')
+        entity['actual_delivery_time'] = processed_data.get('actual_delivery_time')
+        entity['last_updated'] = datetime.now().isoformat()
+        entity['api_call_count'] = entity.get('api_call_count', 0) + 1
+
+        # Calculate days
+        if entity.get('planned_pickup_date'):
+            pickup_date = datetime.fromisoformat(entity['planned_pickup_date']).date()
+            today = date.today()
+            entity['days_until_pickup'] = (pickup_date - today).days if pickup_date > today else 0
+            entity['days_since_pickup'] = (today - pickup_date).days if pickup_date <= today else 0
+
+    def update_tracking_record(
+        self,
+        tracking_number: str,
+        processed_data: Dict,
+        planned_pickup_date: Optional[str] = None,
+        api_call_count: Optional[int] = None
+    ) -> None:
+        """
+        Update tracking record with latest information
+
+        Sends only the changed fields as one MERGE upsert - a single round
+        trip instead of the previous get + replace pair. Callers that
+        already hold planned_pickup_date and api_call_count (both come back
+        from get_active_tracking_numbers) pass them in so the day counters
+        and call counter are computed client-side; otherwise those fields
+        are left untouched on the entity.
+
+        The status index is updated without knowing the previous status, so
+        a moved shipment's old bucket row lingers until the next full
+        (read-based) update cycle corrects it.
+        """
+        entity: Dict[str, Any] = {
+            'PartitionKey': 'tracking',
+            'RowKey': tracking_number,
+            'tracking_number': tracking_number,
+            'ups_status': processed_data['ups_status'],
+            'internal_status': processed_data['internal_status'],
+            'estimated_delivery_date': processed_data.get('estimated_delivery_date'),
+            'actual_delivery_date': processed_data.get('actual_delivery_date'),
+            'actual_delivery_time': processed_data.get('actual_delivery_time'),
+            'last_updated': datetime.now().isoformat()
+        }
+
+        if planned_pickup_date:
+            pickup_date = datetime.fromisoformat(str(planned_pickup_date)).date()
+            today = date.today()
+            entity['planned_pickup_date'] = str(planned_pickup_date)
+            entity['days_until_pickup'] = (pickup_date - today).days if pickup_date > today else 0
+            entity['days_since_pickup'] = (today - pickup_date).days if pickup_date <= today else 0
+
+        if api_call_count is not None:
+            entity['api_call_count'] = api_call_count + 1
+
         try:
-            # Get existing entity
-            entity = self.table_client.get_entity(
+            self.table_client.upsert_entity(entity, mode=UpdateMode.MERGE)
+            self._invalidate_cached_entity(tracking_number)
+            self._update_active_index(tracking_number, entity)
+            self._update_status_index(tracking_number, entity)
+
+        except Exception as e:
+            logging.error("Error updating %s: %s", tracking_number, e)
+
+    async def update_tracking_records_async(
+        self,
+        updates: Dict[str, Dict],
+        max_concurrency: int = 32
+    ) -> Tuple[int, int]:
+        """
+        Update many tracking records concurrently using the async client
+
+        Each update is still a get + replace round-trip, but up to
+        max_concurrency of them are in flight at once, so the wall time
+        for N records is ~N/max_concurrency round-trips instead of N.
+
+        Args:
+            updates: Dictionary of tracking_number -> processed data
+
+        Returns:
+            Tuple of (success_count, error_count)
+        """
+        semaphore = asyncio.Semaphore(max_concurrency)
+        success_count = 0
+        error_count = 0
+
+        async with AsyncTableServiceClient.from_connection_string(self.connection_string) as service:
+            table_client = service.get_table_client(self.table_name)
+
+            async def update_one(tracking_number: str, processed_data: Dict) -> None:
+                nonlocal success_count, error_count
+                async with semaphore:
+                    ok = await self._update_one_async(table_client, tracking_number, processed_data)
+                if ok:
+                    success_count += 1
+                else:
+                    error_count += 1
+
+            await asyncio.gather(*(update_one(tn, data) for tn, data in updates.items()))
+
+        return success_count, error_count
+
+    async def _update_one_async(self, table_client, tracking_number: str, processed_data: Dict) -> bool:
+        """Apply one tracking update through the async client; True on success"""
+        try:
+            entity = await table_client.get_entity(
                 partition_key="tracking",
                 row_key=tracking_number
             )
-            
-            # Update fields
-            entity['ups_status'] = processed_data['ups_status']
-            entity['internal_status'] = processed_data['internal_status']
-            entity['estimated_delivery_date'] = processed_data.get('estimated_delivery_date')
-            entity['actual_delivery_date'] = processed_data.get('actual_delivery_date')
-            entity['actual_delivery_time'] = processed_data.get('actual_delivery_time')
-            entity['last_updated'] = datetime.now().isoformat()
-            entity['api_call_count'] = entity.get('api_call_count', 0) + 1
-            
-            # Calculate days
-            if entity.get('planned_pickup_date'):
-                pickup_date = datetime.fromisoformat(entity['planned_pickup_date']).date()
-                today = date.today()
-                entity['days_until_pickup'] = (pickup_date - today).days if pickup_date > today else 0
-                entity['days_since_pickup'] = (today - pickup_date).days if pickup_date <= today else 0
-            
-            # Update in storage
-            self.table_client.update_entity(entity, mode='replace')
-            
+            previous_status = entity.get('internal_status')
+            self._apply_update(entity, processed_data)
+            await table_client.update_entity(entity, mode='replace')
+            await asyncio.to_thread(self._update_active_index, tracking_number, entity)
+            await asyncio.to_thread(self._update_status_index, tracking_number, entity, previous_status)
+            self._invalidate_cached_entity(tracking_number)
+            return True
         except Exception as e:
-            logging.error(f"Error updating {tracking_number}: {str(e)}")
+            logging.error("Error updating %s: %s", tracking_number, e)
+            return False
+
+    async def update_tracking_records_from_queue(
+        self,
+        queue: asyncio.Queue,
+        num_consumers: int = 8
+    ) -> Tuple[int, int]:
+        """
+        Consume (tracking_number, processed_data) items from a queue
+
+        Runs num_consumers concurrent workers so Table Storage writes overlap
+        with whatever is producing the queue items (UPS fetching/processing).
+        Each consumer exits when it pulls a None sentinel, so the producer
+        must enqueue exactly num_consumers sentinels when done.
+
+        Returns:
+            Tuple of (success_count, error_count)
+        """
+        success_count = 0
+        error_count = 0
+
+        async with AsyncTableServiceClient.from_connection_string(self.connection_string) as service:
+            table_client = service.get_table_client(self.table_name)
+
+            async def consumer() -> None:
+                nonlocal success_count, error_count
+                while True:
+                    item = await queue.get()
+                    try:
+                        if item is None:
+                            return
+                        tracking_number, processed_data = item
+                        if await self._update_one_async(table_client, tracking_number, processed_data):
+                            success_count += 1
+                        else:
+                            error_count += 1
+                    finally:
+                        queue.task_done()
+
+            await asyncio.gather(*(consumer() for _ in range(num_consumers)))
+
+        return success_count, error_count
     
+    def get_shared_ups_token(self) -> Optional[Tuple[str, float]]:
+        """
+        Read the app-wide UPS OAuth token, or None when absent/unreadable
+
+        Stored under its own 'auth' partition, so the tracking queries
+        (PartitionKey eq 'tracking') never see it.
+        """
+        try:
+            entity = self.table_client.get_entity(
+                partition_key='auth',
+                row_key='ups_token'
+            )
+            return entity['access_token'], float(entity['token_expiry'])
+        except Exception:
+            return None
+
+    def save_shared_ups_token(self, access_token: str, token_expiry: float) -> None:
+        """Persist the UPS OAuth token so other workers/instances reuse it"""
+        try:
+            self.table_client.upsert_entity({
+                'PartitionKey': 'auth',
+                'RowKey': 'ups_token',
+                'access_token': access_token,
+                'token_expiry': token_expiry
+            })
+        except Exception as e:
+            logging.warning("Could not persist shared UPS token: %s", e)
+
     def get_database_stats(self) -> Dict[str, Any]:
         """Get statistics about the database"""
-        all_entities = list(self.table_client.list_entities())
-        
-        total = len(all_entities)
-        delivered = sum(1 for e in all_entities if 'delivered' in e.get('internal_status', '').lower())
-        active = total - delivered
-        
-        last_update = max(
-            (e.get('last_updated', '') for e in all_entities),
-            default=None
+
+        # One streaming pass with a two-column projection - the stats are
+        # three scalars, so there is no reason to pull every entity (or
+        # every column) into a list first
+        total = 0
+        delivered = 0
+        last_update = ''
+
+        entities = self.table_client.query_entities(
+            "PartitionKey eq 'tracking'",
+            select=['internal_status', 'last_updated']
         )
-        
+        for entity in entities:
+            total += 1
+            if 'delivered' in entity.get('internal_status', '').lower():
+                delivered += 1
+            updated = entity.get('last_updated', '')
+            if updated > last_update:
+                last_update = updated
+
         return {
             "total_records": total,
-            "active_shipments": active,
+            "active_shipments": total - delivered,
             "delivered_shipments": delivered,
-            "last_update": last_update
+            "last_update": last_update or None
         }
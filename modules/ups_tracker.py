@@ -3,38 +3,58 @@ UPS Tracker - Interface with UPS API
 Reuses logic from existing application
 """
 
+import asyncio
+import aiohttp
 import requests
 import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from typing import Dict, List, Any
 import os
 import time
 
 class UPSTracker:
-    def __init__(self):
-        """Initialize UPS API client"""
-        
+    def __init__(self, token_store=None):
+        """
+        Initialize UPS API client
+
+        Args:
+            token_store: Optional TableStorageManager used to share the
+                OAuth token across workers and cold starts - without it
+                every new instance re-authenticates
+        """
+
         self.client_id = os.getenv('UPS_CLIENT_ID')
         self.client_secret = os.getenv('UPS_CLIENT_SECRET')
         self.base_url = "https://onlinetools.ups.com/api"
-        
+
         if not self.client_id or not self.client_secret:
             raise ValueError("UPS API credentials not configured")
-        
+
         self.access_token = None
         self.token_expiry = 0
+        self.token_store = token_store
+
+        # One session for all sync calls - keep-alive reuses the TCP/TLS
+        # handshake across requests and threads
+        self.session = requests.Session()
     
     def _get_access_token(self) -> str:
         """Get OAuth access token from UPS"""
         
         current_time = time.time()
-        
+
         # Reuse token if still valid
         if self.access_token and current_time < self.token_expiry:
             return self.access_token
-        
+
+        # Another worker or a previous instance may already hold a valid
+        # token - one storage read is far cheaper than an OAuth round trip
+        if self._load_shared_token(current_time):
+            return self.access_token
+
         # Request new token
         auth_url = "https://onlinetools.ups.com/security/v1/oauth/token"
-        
+
         response = requests.post(
             auth_url,
             headers={'Content-Type': 'application/x-www-form-urlencoded'},
@@ -48,48 +68,204 @@ class UPSTracker:
         self.access_token = token_data['access_token']
         # FIX: Convert expires_in to int (UPS returns it as string)
         self.token_expiry = current_time + int(token_data['expires_in']) - 60  # 60s buffer
-        
+
+        self._save_shared_token()
+
         return self.access_token
-    
-    def get_tracking_data(self, tracking_numbers: List[str]) -> Dict[str, Dict[str, Any]]:
+
+    def _load_shared_token(self, current_time: float) -> bool:
+        """Adopt the app-wide token from the store if it's still valid"""
+        if not self.token_store:
+            return False
+
+        shared = self.token_store.get_shared_ups_token()
+        if shared and current_time < shared[1]:
+            self.access_token, self.token_expiry = shared
+            return True
+        return False
+
+    def _save_shared_token(self) -> None:
+        """Publish a freshly acquired token for other workers"""
+        if self.token_store:
+            self.token_store.save_shared_ups_token(self.access_token, self.token_expiry)
+
+    async def _get_access_token_async(self, session: aiohttp.ClientSession) -> str:
+        """Get OAuth access token from UPS (async variant)"""
+
+        current_time = time.time()
+
+        # Reuse token if still valid
+        if self.access_token and current_time < self.token_expiry:
+            return self.access_token
+
+        # Check the shared store before re-authenticating (blocking client,
+        # so off the event loop)
+        if await asyncio.to_thread(self._load_shared_token, current_time):
+            return self.access_token
+
+        # Request new token
+        auth_url = "https://onlinetools.ups.com/security/v1/oauth/token"
+
+        async with session.post(
+            auth_url,
+            headers={'Content-Type': 'application/x-www-form-urlencoded'},
+            auth=aiohttp.BasicAuth(self.client_id, self.client_secret),
+            data={'grant_type': 'client_credentials'}
+        ) as response:
+            response.raise_for_status()
+            token_data = await response.json()
+
+        self.access_token = token_data['access_token']
+        # FIX: Convert expires_in to int (UPS returns it as string)
+        self.token_expiry = current_time + int(token_data['expires_in']) - 60  # 60s buffer
+
+        await asyncio.to_thread(self._save_shared_token)
+
+        return self.access_token
+
+    async def stream_tracking_data(
+        self,
+        tracking_numbers: List[str],
+        queue: asyncio.Queue,
+        max_concurrency: int = 10
+    ) -> int:
         """
-        Get tracking data from UPS API for multiple tracking numbers
-        
+        Fetch tracking data concurrently, streaming results onto a queue
+
+        Each (tracking_number, response) pair is put on the queue as soon as
+        its request completes, so downstream consumers can process and store
+        results while later UPS requests are still in flight. All requests
+        share one aiohttp session and are bounded by a semaphore to respect
+        UPS rate limits.
+
         Args:
             tracking_numbers: List of UPS tracking numbers
-            
+            queue: Destination for (tracking_number, response) pairs
+            max_concurrency: Maximum number of in-flight UPS requests
+
         Returns:
-            Dictionary with tracking_number as key and API response as value
+            Number of tracking numbers fetched
         """
-        
-        results = {}
-        token = self._get_access_token()
-        
-        for tracking_number in tracking_numbers:
-            try:
-                # Call UPS Tracking API
+
+        semaphore = asyncio.Semaphore(max_concurrency)
+
+        async with aiohttp.ClientSession() as session:
+            token = await self._get_access_token_async(session)
+
+            async def fetch_one(tracking_number: str) -> None:
                 url = f"{self.base_url}/track/v1/details/{tracking_number}"
-                
+
                 headers = {
                     'Authorization': f'Bearer {token}',
                     'transId': f'track_{tracking_number}',
                     'transactionSrc': 'AzureFunctionApp'
                 }
-                
-                response = requests.get(url, headers=headers)
-                
-                if response.status_code == 200:
-                    results[tracking_number] = response.json()
-                    logging.info(f"✓ Retrieved tracking data for {tracking_number}")
-                else:
-                    logging.warning(f"⚠ API error for {tracking_number}: {response.status_code}")
-                    results[tracking_number] = {'error': response.status_code}
-                
-                # Rate limiting - don't hammer the API
-                time.sleep(0.2)
-                
-            except Exception as e:
-                logging.error(f"✗ Error getting data for {tracking_number}: {str(e)}")
-                results[tracking_number] = {'error': str(e)}
-        
+
+                try:
+                    async with semaphore:
+                        async with session.get(url, headers=headers) as response:
+                            if response.status == 200:
+                                data = await response.json()
+                                logging.info("✓ Retrieved tracking data for %s", tracking_number)
+                            else:
+                                logging.warning("⚠ API error for %s: %s", tracking_number, response.status)
+                                data = {'error': response.status}
+
+                except Exception as e:
+                    logging.error("✗ Error getting data for %s: %s", tracking_number, e)
+                    data = {'error': str(e)}
+
+                await queue.put((tracking_number, data))
+
+            await asyncio.gather(*(fetch_one(tn) for tn in tracking_numbers))
+
+        return len(tracking_numbers)
+
+    async def get_tracking_data_async(
+        self,
+        tracking_numbers: List[str],
+        max_concurrency: int = 10
+    ) -> Dict[str, Dict[str, Any]]:
+        """
+        Get tracking data from UPS API for multiple tracking numbers concurrently
+
+        Convenience wrapper around stream_tracking_data that collects all
+        results into a dictionary.
+
+        Args:
+            tracking_numbers: List of UPS tracking numbers
+            max_concurrency: Maximum number of in-flight UPS requests
+
+        Returns:
+            Dictionary with tracking_number as key and API response as value
+        """
+
+        queue: asyncio.Queue = asyncio.Queue()
+        await self.stream_tracking_data(tracking_numbers, queue, max_concurrency)
+
+        results = {}
+        while not queue.empty():
+            tracking_number, data = queue.get_nowait()
+            results[tracking_number] = data
+
+        return results
+
+    def _fetch_one(self, tracking_number: str, token: str) -> Dict[str, Any]:
+        """Fetch one tracking number over the shared session"""
+        url = f"{self.base_url}/track/v1/details/{tracking_number}"
+
+        headers = {
+            'Authorization': f'Bearer {token}',
+            'transId': f'track_{tracking_number}',
+            'transactionSrc': 'AzureFunctionApp'
+        }
+
+        response = self.session.get(url, headers=headers)
+
+        if response.status_code == 200:
+            logging.info("✓ Retrieved tracking data for %s", tracking_number)
+            return response.json()
+
+        logging.warning("⚠ API error for %s: %s", tracking_number, response.status_code)
+        return {'error': response.status_code}
+
+    def get_tracking_data(
+        self,
+        tracking_numbers: List[str],
+        max_workers: int = 10
+    ) -> Dict[str, Dict[str, Any]]:
+        """
+        Get tracking data from UPS API for multiple tracking numbers
+
+        The calls are I/O-bound, so they run through a thread pool over the
+        shared keep-alive session: wall time for N numbers is roughly
+        N/max_workers round trips instead of N sequential ones (the old
+        loop also slept 200ms per call on top of that). The pool size
+        bounds concurrent requests against UPS in place of the sleep.
+
+        Args:
+            tracking_numbers: List of UPS tracking numbers
+            max_workers: Maximum number of in-flight UPS requests
+
+        Returns:
+            Dictionary with tracking_number as key and API response as value
+        """
+
+        results: Dict[str, Dict[str, Any]] = {}
+        token = self._get_access_token()
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {
+                executor.submit(self._fetch_one, tn, token): tn
+                for tn in tracking_numbers
+            }
+
+            for future in as_completed(futures):
+                tracking_number = futures[future]
+                try:
+                    results[tracking_number] = future.result()
+                except Exception as e:
+                    logging.error("✗ Error getting data for %s: %s", tracking_number, e)
+                    results[tracking_number] = {'error': str(e)}
+
         return results
\ No newline at end of file